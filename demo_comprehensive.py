@@ -6,6 +6,7 @@ Demonstrates the capabilities of both basic and advanced SQL query visualizers
 
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import time
 
@@ -21,13 +22,17 @@ def print_section(title):
     print(f" {title}")
     print(f"{'-'*60}")
 
-def run_command(cmd, description):
-    """Run a command and show results"""
+def run_command(cmd):
+    """Run a command and capture its output"""
+    return subprocess.run(cmd, capture_output=True, text=True, cwd='/app')
+
+def show_command_result(get_result, cmd, description):
+    """Show a command's results; get_result runs it or waits for a background run"""
     print(f"\n🚀 {description}")
     print(f"Command: {' '.join(cmd)}")
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd='/app')
+        result = get_result()
         
         if result.returncode == 0:
             print("✅ Success!")
@@ -396,14 +401,6 @@ def main():
         ])
     ]
     
-    for description, cmd in basic_tests:
-        success = run_command(cmd, f"Basic Visualizer: {description}")
-        if success:
-            print(f"   📊 Generated demo_basic_* diagrams")
-    
-    # Test advanced visualizer
-    print_section("Testing Advanced SQL Visualizer")
-    
     advanced_tests = [
         ("Simple CTE Query (Advanced)", [
             'python', 'advanced_sql_visualizer.py', 
@@ -431,17 +428,29 @@ def main():
         ])
     ]
     
-    for description, cmd in advanced_tests:
-        success = run_command(cmd, f"Advanced Visualizer: {description}")
-        if success:
-            print(f"   📊 Generated advanced diagrams with enhanced features")
+    # Each visualizer runs in its own process, so start every run up front and report in order
+    with ThreadPoolExecutor(max_workers=len(basic_tests) + len(advanced_tests)) as executor:
+        basic_runs = [executor.submit(run_command, cmd) for _, cmd in basic_tests]
+        advanced_runs = [executor.submit(run_command, cmd) for _, cmd in advanced_tests]
+        
+        for (description, cmd), run in zip(basic_tests, basic_runs):
+            success = show_command_result(run.result, cmd, f"Basic Visualizer: {description}")
+            if success:
+                print(f"   📊 Generated demo_basic_* diagrams")
+        
+        # Test advanced visualizer
+        print_section("Testing Advanced SQL Visualizer")
+        
+        for (description, cmd), run in zip(advanced_tests, advanced_runs):
+            success = show_command_result(run.result, cmd, f"Advanced Visualizer: {description}")
+            if success:
+                print(f"   📊 Generated advanced diagrams with enhanced features")
     
     # Run comprehensive test suite
     print_section("Running Comprehensive Test Suite")
     
-    run_command([
-        'python', 'test_visualizer.py'
-    ], "Complete Test Suite")
+    test_cmd = ['python', 'test_visualizer.py']
+    show_command_result(lambda: run_command(test_cmd), test_cmd, "Complete Test Suite")
     
     # Generate summary
     print_section("Generated Files Summary")
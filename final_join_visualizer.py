@@ -5,6 +5,12 @@ Robust version that correctly parses and visualizes SQL joins with focus on join
 """
 
 import re
+import os
+import copy
+import subprocess
+from functools import lru_cache
+from collections import Counter
+from pathlib import Path
 import graphviz
 import click
 from dataclasses import dataclass, field
@@ -12,6 +18,35 @@ from typing import Dict, List, Tuple, Optional
 from enum import Enum
 
 
+# Comment stripping and whitespace normalization for _clean_sql
+_RE_LINE_COMMENT = re.compile(r'--.*$', re.MULTILINE)
+_RE_BLOCK_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_RE_WHITESPACE = re.compile(r'\s+')
+
+# Main FROM table (name, alias)
+_RE_FROM_TABLE = re.compile(r'FROM\s+([\w\.]+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# A join condition runs up to the next JOIN, the next clause keyword, or the end of the statement
+_JOIN_CONDITION_END = (
+    r'(?=\s+(?:(?:inner|left|right|full|cross)\s+(?:outer\s+)?)?join\s'
+    r'|\s+(?:where|group\s+by|order\s+by|having|limit)\b|\s*;|$)'
+)
+
+# First table.column = table.column pair in a join condition
+_RE_JOIN_COLUMNS = re.compile(r'(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)')
+
+# Full join clause (type, table, alias, condition); a single forward scan yields every join.
+# Matched against lowercased SQL without re.IGNORECASE, which roughly halves the scan time.
+_RE_JOIN_FULL = re.compile(
+    r'((?:inner\s+|left\s+(?:outer\s+)?|right\s+(?:outer\s+)?|full\s+(?:outer\s+)?|cross\s+)?join)'
+    r'\s+([\w\.]+)(?:\s+(?:as\s+)?(\w+))?\s+on\s+(.+?)'
+    + _JOIN_CONDITION_END
+)
+
+# Lowercases ASCII letters only, so offsets into the result line up with the original string
+_ASCII_LOWERCASE = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
 class JoinType(Enum):
     INNER = "INNER"
     LEFT = "LEFT"
@@ -20,14 +55,18 @@ class JoinType(Enum):
     CROSS = "CROSS"
 
 
-@dataclass
+# Join type by the first keyword of the join clause ("LEFT OUTER JOIN" -> LEFT); a bare JOIN is INNER
+_JOIN_TYPE_BY_KEYWORD = {join_type.value: join_type for join_type in JoinType}
+
+
+@dataclass(slots=True)
 class Table:
     name: str
     alias: str
-    join_columns: List[str] = field(default_factory=list)
+    join_columns: Dict[str, None] = field(default_factory=dict)  # Insertion-ordered set of column names
 
 
-@dataclass
+@dataclass(slots=True)
 class Join:
     left_table: str
     right_table: str
@@ -46,6 +85,17 @@ class RobustJoinParser:
     
     def parse_query(self, sql: str) -> Dict[str, any]:
         """Parse SQL query focusing on join relationships"""
+        # Repeated queries (e.g. re-running on an unchanged file) reuse the memoized result;
+        # callers get their own copy
+        result = copy.deepcopy(_parse_query_cached(sql))
+        
+        self.tables = result['tables']
+        self.joins = result['joins']
+        
+        return result
+    
+    def _parse_query_uncached(self, sql: str) -> Dict[str, any]:
+        """Parse SQL and extract tables and joins from scratch"""
         # Reset state
         self.tables = {}
         self.joins = []
@@ -65,31 +115,33 @@ class RobustJoinParser:
         # Process joins sequentially
         self._process_joins(joins_data)
         
+        join_type_counts = Counter(join.join_type for join in self.joins)
         return {
             'tables': self.tables,
             'joins': self.joins,
             'summary': {
                 'table_count': len(self.tables),
                 'join_count': len(self.joins),
-                'join_types': {jt.value: len([j for j in self.joins if j.join_type == jt]) for jt in JoinType}
+                'join_types': {jt.value: join_type_counts[jt] for jt in JoinType}
             }
         }
     
     def _clean_sql(self, sql: str) -> str:
         """Clean and normalize SQL"""
-        # Remove comments
-        sql = re.sub(r'--.*$', '', sql, flags=re.MULTILINE)
-        sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
+        # Remove comments (the substring checks skip a full regex pass when there are none)
+        if '--' in sql:
+            sql = _RE_LINE_COMMENT.sub('', sql)
+        if '/*' in sql:
+            sql = _RE_BLOCK_COMMENT.sub('', sql)
         
         # Normalize whitespace
-        sql = re.sub(r'\s+', ' ', sql.strip())
+        sql = _RE_WHITESPACE.sub(' ', sql.strip())
         
         return sql
     
     def _extract_from_table(self, sql: str) -> Optional[Tuple[str, str]]:
         """Extract the main table from FROM clause"""
-        pattern = r'FROM\s+([\w\.]+)(?:\s+(?:AS\s+)?(\w+))?'
-        match = re.search(pattern, sql, re.IGNORECASE)
+        match = _RE_FROM_TABLE.search(sql)
         
         if match:
             table_name = match.group(1)
@@ -99,76 +151,21 @@ class RobustJoinParser:
         return None
     
     def _extract_joins_comprehensive(self, sql: str) -> List[Tuple[str, str, str, str]]:
-        """Extract joins using comprehensive pattern matching"""
-        joins = []
-        
-        # Strategy 1: Individual join extraction
-        # Find all JOIN clauses with their complete ON conditions
-        join_clauses = self._split_join_clauses(sql)
+        """Extract (join type, table, alias, condition) for every join in one pass over the SQL"""
+        # Match keywords on a lowercased copy and slice identifiers from the original by span;
+        # str.lower() can change the length of non-ASCII text, so that case lowers ASCII only
+        sql_lc = sql.lower() if sql.isascii() else sql.translate(_ASCII_LOWERCASE)
         
-        for clause in join_clauses:
-            join_data = self._parse_single_join_clause(clause)
-            if join_data:
-                joins.append(join_data)
+        joins = []
+        for match in _RE_JOIN_FULL.finditer(sql_lc):
+            join_type, table_name, alias, condition = (
+                sql[match.start(group):match.end(group)] if match.start(group) >= 0 else None
+                for group in range(1, 5)
+            )
+            joins.append((join_type.strip(), table_name, alias or table_name, condition.strip()))
         
         return joins
     
-    def _split_join_clauses(self, sql: str) -> List[str]:
-        """Split SQL into individual join clauses"""
-        # Find the FROM clause - just the FROM table part
-        from_match = re.search(r'FROM\s+([\w\.]+(?:\s+(?:AS\s+)?\w+)?)', sql, re.IGNORECASE)
-        if not from_match:
-            return []
-        
-        # Get the part after the FROM table
-        from_end = from_match.end()
-        after_from = sql[from_end:].strip()
-        
-        # Now extract all JOIN clauses
-        # Look for JOIN patterns and capture until the next JOIN or WHERE/GROUP/ORDER
-        join_pattern = r'((?:INNER\s+|LEFT\s+(?:OUTER\s+)?|RIGHT\s+(?:OUTER\s+)?|FULL\s+(?:OUTER\s+)?|CROSS\s+)?JOIN\s+\w+(?:\s+(?:AS\s+)?\w+)?\s+ON\s+[^WHERE]+?)(?=\s*(?:INNER\s+|LEFT\s+|RIGHT\s+|FULL\s+|CROSS\s+)?JOIN|WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|$)'
-        
-        join_matches = re.findall(join_pattern, after_from, re.IGNORECASE | re.DOTALL)
-        
-        # If that doesn't work, try to split manually by JOIN keywords
-        if not join_matches and 'JOIN' in after_from.upper():
-            # Split on JOIN keywords and reconstruct
-            parts = re.split(r'\s+((?:INNER\s+|LEFT\s+(?:OUTER\s+)?|RIGHT\s+(?:OUTER\s+)?|FULL\s+(?:OUTER\s+)?|CROSS\s+)?JOIN)', after_from, flags=re.IGNORECASE)
-            
-            join_matches = []
-            for i in range(1, len(parts), 2):  # Every other part starting from index 1
-                if i + 1 < len(parts):
-                    join_type = parts[i]
-                    rest = parts[i + 1]
-                    
-                    # Extract until next JOIN or end clause
-                    end_match = re.search(r'(?=\s*(?:INNER\s+|LEFT\s+|RIGHT\s+|FULL\s+|CROSS\s+)?JOIN|WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|$)', rest, re.IGNORECASE)
-                    if end_match:
-                        rest = rest[:end_match.start()]
-                    
-                    join_clause = f"{join_type} {rest}".strip()
-                    if 'ON' in join_clause:
-                        join_matches.append(join_clause)
-        
-        return [match.strip() for match in join_matches if match.strip()]
-    
-    def _parse_single_join_clause(self, clause: str) -> Optional[Tuple[str, str, str, str]]:
-        """Parse a single join clause"""
-        # Pattern to extract join type, table, alias, and condition
-        pattern = r'((?:INNER\s+|LEFT\s+(?:OUTER\s+)?|RIGHT\s+(?:OUTER\s+)?|FULL\s+(?:OUTER\s+)?|CROSS\s+)?JOIN)\s+([\w\.]+)(?:\s+(?:AS\s+)?(\w+))?\s+ON\s+(.+)'
-        
-        match = re.search(pattern, clause, re.IGNORECASE | re.DOTALL)
-        
-        if match:
-            join_type = match.group(1).strip()
-            table_name = match.group(2)
-            alias = match.group(3) or table_name
-            condition = match.group(4).strip()
-            
-            return join_type, table_name, alias, condition
-        
-        return None
-    
     def _process_joins(self, joins_data: List[Tuple[str, str, str, str]]):
         """Process extracted joins and build relationships"""
         # Get the list of table aliases in order
@@ -202,10 +199,10 @@ class RobustJoinParser:
                 self.joins.append(join)
                 
                 # Update table join columns
-                if left_col and left_col not in self.tables[prev_table].join_columns:
-                    self.tables[prev_table].join_columns.append(left_col)
-                if right_col and right_col not in self.tables[alias].join_columns:
-                    self.tables[alias].join_columns.append(right_col)
+                if left_col:
+                    self.tables[prev_table].join_columns[left_col] = None
+                if right_col:
+                    self.tables[alias].join_columns[right_col] = None
             
             # Add current table to order if not already there
             if alias not in table_order:
@@ -213,24 +210,13 @@ class RobustJoinParser:
     
     def _parse_join_type(self, join_type_str: str) -> JoinType:
         """Parse join type from string"""
-        join_type_str = join_type_str.upper()
-        
-        if 'LEFT' in join_type_str:
-            return JoinType.LEFT
-        elif 'RIGHT' in join_type_str:
-            return JoinType.RIGHT
-        elif 'FULL' in join_type_str:
-            return JoinType.FULL
-        elif 'CROSS' in join_type_str:
-            return JoinType.CROSS
-        else:
-            return JoinType.INNER
+        first_keyword = join_type_str.split(None, 1)[0].upper()
+        return _JOIN_TYPE_BY_KEYWORD.get(first_keyword, JoinType.INNER)
     
     def _extract_join_columns(self, condition: str, left_table: str, right_table: str) -> Tuple[str, str]:
         """Extract join columns from condition"""
         # Look for pattern: table.column = table.column
-        pattern = r'(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)'
-        match = re.search(pattern, condition)
+        match = _RE_JOIN_COLUMNS.search(condition)
         
         if match:
             table1_alias, col1, table2_alias, col2 = match.groups()
@@ -247,6 +233,12 @@ class RobustJoinParser:
         return "", ""
 
 
+@lru_cache(maxsize=256)
+def _parse_query_cached(sql: str) -> Dict[str, any]:
+    """Parse once per distinct SQL text; RobustJoinParser.parse_query hands out copies"""
+    return RobustJoinParser()._parse_query_uncached(sql)
+
+
 class JoinFocusedVisualizer:
     """Visualizer that emphasizes join relationships and columns with improved layout"""
     
@@ -259,7 +251,7 @@ class JoinFocusedVisualizer:
             JoinType.CROSS: '#F44336'
         }
     
-    def generate_diagram(self, data: Dict, output_path: str):
+    def generate_diagram(self, data: Dict, output_path: str, formats: Tuple[str, ...] = ('svg', 'png')):
         """Generate join-focused diagram with improved vertical layout"""
         tables = data['tables']
         joins = data['joins']
@@ -293,11 +285,18 @@ class JoinFocusedVisualizer:
         for join in joins:
             self._add_join_edge(dot, join)
         
-        # Render
+        # Render only the requested formats, all from a single layout pass
         try:
-            dot.render(output_path, format='svg', cleanup=True)
-            dot.render(output_path, format='png', cleanup=True)
-            print(f"✅ Join-focused diagram saved: {output_path}.svg and {output_path}.png")
+            source_path = dot.save(f"{output_path}.gv")
+            output_args = []
+            for fmt in formats:
+                output_args += [f'-T{fmt}', '-o', f"{output_path}.{fmt}"]
+            try:
+                subprocess.run(['dot', *output_args, source_path], check=True, capture_output=True)
+            finally:
+                os.remove(source_path)
+            saved = " and ".join(f"{output_path}.{fmt}" for fmt in formats)
+            print(f"✅ Join-focused diagram saved: {saved}")
         except Exception as e:
             print(f"❌ Error generating diagram: {e}")
     
@@ -367,26 +366,28 @@ class JoinFocusedVisualizer:
                 for table_name in table_names:
                     if table_name in tables:
                         table = tables[table_name]
-                        label = self._create_vertical_table_label(table)
+                        label = self._create_vertical_table_label(table.alias, table.name, tuple(table.join_columns))
                         level_graph.node(table_name, label=label)
     
-    def _create_vertical_table_label(self, table: Table) -> str:
-        """Create vertical table label emphasizing join columns"""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _create_vertical_table_label(alias: str, name: str, join_columns: Tuple[str, ...]) -> str:
+        """Create vertical table label emphasizing join columns (memoized per table shape)"""
         label_lines = []
         
         # Table header with styling
-        if table.alias != table.name:
-            header = f"{table.alias}\\n({table.name})"
+        if alias != name:
+            header = f"{alias}\\n({name})"
         else:
-            header = table.name
+            header = name
         
         label_lines.append(f"📋 {header}")
         label_lines.append("=" * 15)  # Separator line
         
         # Join columns section (most important)
-        if table.join_columns:
+        if join_columns:
             label_lines.append("🔑 JOIN COLUMNS:")
-            for col in table.join_columns:
+            for col in join_columns:
                 label_lines.append(f"  • {col}")
         else:
             label_lines.append("ℹ️  No join columns")
@@ -425,8 +426,9 @@ class JoinFocusedVisualizer:
 @click.option('--sql-file', '-f', type=click.Path(exists=True), help='Path to SQL file')
 @click.option('--sql', '-s', type=str, help='SQL query string')
 @click.option('--output', '-o', default='final_join_diagram', help='Output file name')
+@click.option('--formats', default='svg,png', help='Comma-separated output formats (e.g. svg or svg,png)')
 @click.option('--verbose', '-v', is_flag=True, help='Show detailed information')
-def main(sql_file, sql, output, verbose):
+def main(sql_file, sql, output, formats, verbose):
     """Final Join-Focused SQL Visualizer"""
     
     if not sql_file and not sql:
@@ -436,8 +438,8 @@ def main(sql_file, sql, output, verbose):
     # Read SQL
     sql_content = ""
     if sql_file:
-        with open(sql_file, 'r') as f:
-            sql_content = f.read()
+        # Decode once straight from the file; invalid bytes become U+FFFD instead of aborting
+        sql_content = Path(sql_file).read_text(encoding='utf-8', errors='replace')
     else:
         sql_content = sql
     
@@ -447,7 +449,8 @@ def main(sql_file, sql, output, verbose):
     
     # Generate visualization
     visualizer = JoinFocusedVisualizer()
-    visualizer.generate_diagram(data, output)
+    output_formats = tuple(fmt.strip() for fmt in formats.split(',') if fmt.strip())
+    visualizer.generate_diagram(data, output, output_formats)
     
     # Print summary
     summary = data['summary']
@@ -13,7 +13,29 @@ import graphviz
 import click
 import json
 from enum import Enum
-import uuid
+from functools import lru_cache
+from collections import Counter, defaultdict, deque
+import copy
+from pathlib import Path
+
+try:
+    import cairosvg  # Optional: converts the rendered SVG to PNG without a second Graphviz run
+except (ImportError, OSError):  # OSError: cairosvg installed but the cairo library is missing
+    cairosvg = None
+
+# Inputs above this many characters get a warning before the (expensive) sqlglot parse
+LARGE_SQL_THRESHOLD = 5_000_000
+
+# Global Graphviz attributes shared by every hierarchical diagram (Digraph copies them)
+_GRAPH_ATTR = {
+    'rankdir': 'LR',  # Left to right
+    'splines': 'ortho',
+    'nodesep': '1.2',
+    'ranksep': '2.0',
+    'fontname': 'Arial'
+}
+_NODE_ATTR = {'shape': 'box', 'style': 'filled', 'fontname': 'Arial'}
+_EDGE_ATTR = {'fontname': 'Arial', 'fontsize': '9'}
 
 
 class QueryNodeType(Enum):
@@ -32,7 +54,7 @@ class JoinType(Enum):
     CROSS = "CROSS"
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryElement:
     """Represents any element in the query hierarchy"""
     id: str
@@ -51,7 +73,7 @@ class QueryElement:
             self.alias = self.name
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryJoin:
     """Represents a join relationship between query elements"""
     left_element_id: str
@@ -64,67 +86,117 @@ class QueryJoin:
 class HierarchicalSQLParser:
     """Parser that understands the hierarchical structure of SQL queries"""
     
-    def __init__(self):
+    def __init__(self, dialect: str = ""):
+        self.dialect = dialect
         self.elements: Dict[str, QueryElement] = {}
         self.joins: List[QueryJoin] = []
-        self.hierarchy_levels: Dict[int, List[str]] = {}  # level -> element_ids
+        self.hierarchy_levels: Dict[int, List[str]] = defaultdict(list)  # level -> element_ids
         self.max_level: int = 0
+        self._tables_cache: Dict[int, List[str]] = {}  # id(select node) -> table names
+        self._id_counter: int = 0
+        self._type_counts: Counter = Counter()  # QueryNodeType -> elements created so far
+        self._sql_cache: Dict[int, str] = {}  # id(node) -> generated SQL
     
     def parse_query(self, sql: str) -> Dict[str, Any]:
-        """Parse SQL with full hierarchical understanding"""
+        """Parse SQL with full hierarchical understanding (cached per SQL text and dialect)"""
         try:
-            # Parse with SQLGlot
-            parsed = sqlglot.parse_one(sql, read='')
-            
-            # Reset state
-            self.elements = {}
-            self.joins = []
-            self.hierarchy_levels = {}
-            self.max_level = 0
-            
-            # Build hierarchical structure
-            self._analyze_query_hierarchy(parsed, level=0, parent_id=None)
-            
-            # Organize elements by level
-            self._organize_by_levels()
-            
-            # Analyze joins within and across levels
-            self._analyze_hierarchical_joins()
-            
-            return {
-                'elements': self.elements,
-                'joins': self.joins,
-                'hierarchy_levels': self.hierarchy_levels,
-                'max_level': self.max_level,
-                'summary': self._generate_hierarchy_summary()
-            }
-            
+            # Deep copy so callers can mutate the result without corrupting the cache
+            result = copy.deepcopy(_parse_query_cached(sql, self.dialect))
         except Exception as e:
+            # Failures propagate out of the cached parse, so they are never memoized
             print(f"Error parsing SQL: {e}")
-            return {
+            result = {
                 'elements': {},
                 'joins': [],
                 'hierarchy_levels': {},
                 'max_level': 0,
                 'summary': {}
             }
+        
+        self.elements = result['elements']
+        self.joins = result['joins']
+        self.hierarchy_levels = result['hierarchy_levels']
+        self.max_level = result['max_level']
+        
+        return result
+    
+    def _parse_query_uncached(self, sql: str) -> Dict[str, Any]:
+        """Parse SQL and build the hierarchy from scratch (raises on parse errors)"""
+        # Parse with SQLGlot
+        parsed = sqlglot.parse_one(sql, read=self.dialect)
+        
+        # Reset state
+        self.elements = {}
+        self.joins = []
+        self.hierarchy_levels = defaultdict(list)
+        self.max_level = 0
+        self._tables_cache = {}
+        self._id_counter = 0
+        self._type_counts = Counter()
+        self._sql_cache = {}
+        
+        # Build hierarchical structure (elements are grouped by level as they are created)
+        self._analyze_query_hierarchy(parsed, level=0, parent_id=None)
+        
+        # Analyze joins within and across levels
+        self._analyze_hierarchical_joins()
+        
+        return {
+            'elements': self.elements,
+            'joins': self.joins,
+            'hierarchy_levels': dict(self.hierarchy_levels),
+            'max_level': self.max_level,
+            'summary': self._generate_hierarchy_summary()
+        }
     
     def _analyze_query_hierarchy(self, node, level: int, parent_id: Optional[str]):
-        """Recursively analyze the query hierarchy"""
-        if isinstance(node, exp.Select):
-            return self._process_select_statement(node, level, parent_id)
+        """Walk the query hierarchy with an explicit stack instead of recursion"""
+        dispatch = {
+            exp.Select: self._process_select_statement,
+            exp.With: self._process_with_clause,
+            exp.CTE: self._process_cte,
+            exp.Subquery: self._process_subquery,
+            exp.Table: self._process_table_reference
+        }
+        
+        # Children are pushed in reverse so elements are created in the same pre-order as before
+        stack = deque([(node, level, parent_id)])
+        
+        while stack:
+            node, level, parent_id = stack.pop()
             
-        elif isinstance(node, exp.With):
-            return self._process_with_clause(node, level, parent_id)
+            handler = dispatch.get(type(node))
+            if handler is None:
+                # For other node types, keep traversing at the same level and parent
+                children = self._collect_child_expressions(node)
+                stack.extend((child, level, parent_id) for child in reversed(children))
+                continue
             
-        elif isinstance(node, exp.Subquery):
-            return self._process_subquery(node, level, parent_id)
+            element_id, children = handler(node, level, parent_id)
+            self.hierarchy_levels[level].append(element_id)
+            self._type_counts[self.elements[element_id].node_type] += 1
             
-        elif isinstance(node, exp.Table):
-            return self._process_table_reference(node, level, parent_id)
-        
-        # For other node types, continue traversing
-        element_ids = []
+            # Add to parent's children
+            if parent_id and parent_id in self.elements:
+                self.elements[parent_id].children_ids.append(element_id)
+            
+            stack.extend((child, child_level, element_id) for child, child_level in reversed(children))
+    
+    def _next_id(self) -> str:
+        """Return a unique element id for this parse"""
+        self._id_counter += 1
+        return f"e{self._id_counter}"
+    
+    def _node_sql(self, node) -> str:
+        """Generate SQL for a node once per parse (copy=False skips sqlglot's defensive AST copy)"""
+        cache_key = id(node)
+        if cache_key not in self._sql_cache:
+            self._sql_cache[cache_key] = node.sql(dialect=self.dialect, copy=False)
+        return self._sql_cache[cache_key]
+    
+    def _collect_child_expressions(self, node) -> List[Any]:
+        """Collect the direct child expressions of a node that has no dedicated handler"""
+        children = []
         
         # Check if node has common SQL structure attributes
         if hasattr(node, 'args') and hasattr(node.args, 'get'):
@@ -133,27 +205,26 @@ class HierarchicalSQLParser:
                 if value is not None:
                     if isinstance(value, list):
                         for item in value:
-                            if hasattr(item, '__class__') and 'exp.' in str(item.__class__):
-                                child_ids = self._analyze_query_hierarchy(item, level, parent_id)
-                                element_ids.extend(child_ids)
-                    elif hasattr(value, '__class__') and 'exp.' in str(value.__class__):
-                        child_ids = self._analyze_query_hierarchy(value, level, parent_id)
-                        element_ids.extend(child_ids)
-        
-        return element_ids
+                            if isinstance(item, exp.Expression):
+                                children.append(item)
+                    elif isinstance(value, exp.Expression):
+                        children.append(value)
+        
+        return children
     
-    def _process_select_statement(self, select_node, level: int, parent_id: Optional[str]) -> List[str]:
+    def _process_select_statement(self, select_node, level: int, parent_id: Optional[str]) -> Tuple[str, List[Tuple[Any, int]]]:
         """Process a SELECT statement"""
-        element_id = str(uuid.uuid4())[:8]
+        element_id = self._next_id()
         
         # Extract basic info
         tables = self._extract_tables_from_select(select_node)
-        sql_snippet = str(select_node)[:100] + "..." if len(str(select_node)) > 100 else str(select_node)
+        select_sql = self._node_sql(select_node)
+        sql_snippet = select_sql[:100] + "..." if len(select_sql) > 100 else select_sql
         
         element = QueryElement(
             id=element_id,
             node_type=QueryNodeType.SELECT_STATEMENT,
-            name=f"SELECT_{level}_{len([e for e in self.elements.values() if e.node_type == QueryNodeType.SELECT_STATEMENT])}",
+            name=f"SELECT_{level}_{self._type_counts[QueryNodeType.SELECT_STATEMENT]}",
             level=level,
             parent_id=parent_id,
             tables=tables,
@@ -163,48 +234,41 @@ class HierarchicalSQLParser:
         self.elements[element_id] = element
         self.max_level = max(self.max_level, level)
         
-        # Add to parent's children
-        if parent_id and parent_id in self.elements:
-            self.elements[parent_id].children_ids.append(element_id)
-        
-        # Process child elements (subqueries, joins, etc.)
-        child_ids = []
+        # Collect child elements (CTEs, subqueries, joins, etc.)
+        children = []
+        args = select_node.args
         
-        # Process FROM clause
-        if hasattr(select_node, 'from_') and select_node.from_:
-            from_child_ids = self._analyze_query_hierarchy(select_node.from_, level + 1, element_id)
-            child_ids.extend(from_child_ids)
+        # WITH clause (sqlglot attaches CTEs to the SELECT they prefix)
+        with_clause = args.get('with_')
+        if with_clause:
+            children.append((with_clause, level + 1))
         
-        # Process JOINs
-        if hasattr(select_node, 'joins') and select_node.joins:
-            for join in select_node.joins:
-                join_child_ids = self._analyze_query_hierarchy(join, level + 1, element_id)
-                child_ids.extend(join_child_ids)
+        # FROM clause
+        from_clause = args.get('from_')
+        if from_clause:
+            children.append((from_clause, level + 1))
         
-        # Process WHERE clause for subqueries
-        if hasattr(select_node, 'where') and select_node.where:
-            where_child_ids = self._analyze_query_hierarchy(select_node.where, level + 1, element_id)
-            child_ids.extend(where_child_ids)
+        # JOINs
+        for join in args.get('joins') or ():
+            children.append((join, level + 1))
         
-        # Process SELECT expressions for subqueries
-        if hasattr(select_node, 'expressions') and select_node.expressions:
-            for expr in select_node.expressions:
-                expr_child_ids = self._analyze_query_hierarchy(expr, level + 1, element_id)
-                child_ids.extend(expr_child_ids)
+        # WHERE clause for subqueries
+        where_clause = args.get('where')
+        if where_clause:
+            children.append((where_clause, level + 1))
         
-        element.children_ids.extend(child_ids)
+        # SELECT expressions for subqueries
+        for expr in args.get('expressions') or ():
+            children.append((expr, level + 1))
         
-        return [element_id]
+        return element_id, children
     
-    def _process_with_clause(self, with_node, level: int, parent_id: Optional[str]) -> List[str]:
+    def _process_with_clause(self, with_node, level: int, parent_id: Optional[str]) -> Tuple[str, List[Tuple[Any, int]]]:
         """Process a WITH clause (CTE container)"""
-        element_id = str(uuid.uuid4())[:8]
+        element_id = self._next_id()
         
-        cte_names = []
-        if hasattr(with_node, 'expressions'):
-            for cte_expr in with_node.expressions:
-                if hasattr(cte_expr, 'alias'):
-                    cte_names.append(str(cte_expr.alias))
+        cte_exprs = with_node.args.get('expressions') or ()
+        cte_names = [cte_expr.alias for cte_expr in cte_exprs]
         
         element = QueryElement(
             id=element_id,
@@ -219,27 +283,21 @@ class HierarchicalSQLParser:
         self.elements[element_id] = element
         self.max_level = max(self.max_level, level)
         
-        # Process individual CTEs
-        child_ids = []
-        if hasattr(with_node, 'expressions'):
-            for cte_expr in with_node.expressions:
-                cte_id = self._process_cte(cte_expr, level + 1, element_id)
-                child_ids.extend(cte_id)
+        # Individual CTEs
+        children = [(cte_expr, level + 1) for cte_expr in cte_exprs]
         
-        # Process the main query that comes after WITH
-        if hasattr(with_node, 'this') and with_node.this:
-            main_query_ids = self._analyze_query_hierarchy(with_node.this, level + 1, element_id)
-            child_ids.extend(main_query_ids)
+        # The main query that comes after WITH
+        main_query = with_node.args.get('this')
+        if main_query:
+            children.append((main_query, level + 1))
         
-        element.children_ids = child_ids
-        
-        return [element_id]
+        return element_id, children
     
-    def _process_cte(self, cte_node, level: int, parent_id: str) -> List[str]:
+    def _process_cte(self, cte_node, level: int, parent_id: str) -> Tuple[str, List[Tuple[Any, int]]]:
         """Process a single CTE"""
-        element_id = str(uuid.uuid4())[:8]
+        element_id = self._next_id()
         
-        cte_name = str(cte_node.alias) if hasattr(cte_node, 'alias') else f"CTE_{element_id}"
+        cte_name = cte_node.alias or f"CTE_{element_id}"
         
         element = QueryElement(
             id=element_id,
@@ -254,21 +312,20 @@ class HierarchicalSQLParser:
         self.elements[element_id] = element
         self.max_level = max(self.max_level, level)
         
-        # Process the CTE's SELECT statement
-        child_ids = []
-        if hasattr(cte_node, 'this'):
-            cte_select_ids = self._analyze_query_hierarchy(cte_node.this, level + 1, element_id)
-            child_ids.extend(cte_select_ids)
-        
-        element.children_ids = child_ids
+        # The CTE's SELECT statement
+        children = []
+        cte_query = cte_node.args.get('this')
+        if cte_query:
+            children.append((cte_query, level + 1))
         
-        return [element_id]
+        return element_id, children
     
-    def _process_subquery(self, subquery_node, level: int, parent_id: Optional[str]) -> List[str]:
+    def _process_subquery(self, subquery_node, level: int, parent_id: Optional[str]) -> Tuple[str, List[Tuple[Any, int]]]:
         """Process a subquery"""
-        element_id = str(uuid.uuid4())[:8]
+        element_id = self._next_id()
         
-        alias = str(subquery_node.alias) if hasattr(subquery_node, 'alias') and subquery_node.alias else f"SUBQ_{element_id}"
+        subquery_body = subquery_node.args.get('this')
+        alias = subquery_node.alias or f"SUBQ_{element_id}"
         
         element = QueryElement(
             id=element_id,
@@ -277,28 +334,25 @@ class HierarchicalSQLParser:
             alias=alias,
             level=level,
             parent_id=parent_id,
-            sql_snippet=f"({str(subquery_node.this)[:50]}...)" if hasattr(subquery_node, 'this') else "(SELECT ...)"
+            sql_snippet=f"({self._node_sql(subquery_body)[:50]}...)" if subquery_body else "(SELECT ...)"
         )
         
         self.elements[element_id] = element
         self.max_level = max(self.max_level, level)
         
-        # Process the subquery's content
-        child_ids = []
-        if hasattr(subquery_node, 'this'):
-            subq_content_ids = self._analyze_query_hierarchy(subquery_node.this, level + 1, element_id)
-            child_ids.extend(subq_content_ids)
-        
-        element.children_ids = child_ids
+        # The subquery's content
+        children = []
+        if subquery_body:
+            children.append((subquery_body, level + 1))
         
-        return [element_id]
+        return element_id, children
     
-    def _process_table_reference(self, table_node, level: int, parent_id: Optional[str]) -> List[str]:
+    def _process_table_reference(self, table_node, level: int, parent_id: Optional[str]) -> Tuple[str, List[Tuple[Any, int]]]:
         """Process a table reference"""
-        element_id = str(uuid.uuid4())[:8]
+        element_id = self._next_id()
         
-        table_name = str(table_node.name) if hasattr(table_node, 'name') else str(table_node)
-        alias = str(table_node.alias) if hasattr(table_node, 'alias') and table_node.alias else table_name
+        table_name = table_node.name
+        alias = table_node.alias or table_name
         
         element = QueryElement(
             id=element_id,
@@ -314,36 +368,21 @@ class HierarchicalSQLParser:
         self.elements[element_id] = element
         self.max_level = max(self.max_level, level)
         
-        return [element_id]
+        return element_id, []
     
     def _extract_tables_from_select(self, select_node) -> List[str]:
-        """Extract table names from a SELECT statement"""
-        tables = []
-        
-        # Get tables from FROM clause
-        if hasattr(select_node, 'from_') and select_node.from_:
-            from_tables = select_node.from_.find_all(exp.Table)
-            for table in from_tables:
-                if hasattr(table, 'name'):
-                    tables.append(str(table.name))
-        
-        # Get tables from JOINs
-        if hasattr(select_node, 'joins') and select_node.joins:
-            for join in select_node.joins:
-                join_tables = join.find_all(exp.Table)
-                for table in join_tables:
-                    if hasattr(table, 'name'):
-                        tables.append(str(table.name))
-        
-        return list(set(tables))  # Remove duplicates
-    
-    def _organize_by_levels(self):
-        """Organize elements by their hierarchy levels"""
-        for element in self.elements.values():
-            level = element.level
-            if level not in self.hierarchy_levels:
-                self.hierarchy_levels[level] = []
-            self.hierarchy_levels[level].append(element.id)
+        """Extract table names from a SELECT statement (memoized per node for this parse)"""
+        cache_key = id(select_node)
+        if cache_key not in self._tables_cache:
+            # Walk the FROM clause and every JOIN in a single pass, deduplicating as we go
+            clauses = [select_node.args.get('from_')] + list(select_node.args.get('joins') or [])
+            self._tables_cache[cache_key] = list({
+                str(table.name)
+                for clause in clauses if clause
+                for table in clause.find_all(exp.Table) if table.name
+            })
+        
+        return list(self._tables_cache[cache_key])
     
     def _analyze_hierarchical_joins(self):
         """Analyze joins within the hierarchical structure"""
@@ -356,41 +395,34 @@ class HierarchicalSQLParser:
         summary = {
             'total_elements': len(self.elements),
             'max_nesting_level': self.max_level,
-            'elements_by_type': {},
-            'elements_by_level': {}
+            # Count by type
+            'elements_by_type': {node_type.value: count for node_type, count in self._type_counts.items()},
+            # Count by level
+            'elements_by_level': {level: len(element_ids) for level, element_ids in self.hierarchy_levels.items()}
         }
         
-        # Count by type
-        for element in self.elements.values():
-            node_type = element.node_type.value
-            summary['elements_by_type'][node_type] = summary['elements_by_type'].get(node_type, 0) + 1
-        
-        # Count by level
-        for level, element_ids in self.hierarchy_levels.items():
-            summary['elements_by_level'][level] = len(element_ids)
-        
         return summary
 
 
+@lru_cache(maxsize=200)
+def _parse_query_cached(sql: str, dialect: str) -> Dict[str, Any]:
+    """Parse once per (sql, dialect) pair; HierarchicalSQLParser.parse_query hands out copies"""
+    return HierarchicalSQLParser(dialect)._parse_query_uncached(sql)
+
+
 class HierarchicalDiagramGenerator:
     """Generates diagrams showing hierarchical query structure"""
     
     def __init__(self):
-        self.node_colors = {
-            QueryNodeType.SELECT_STATEMENT: '#E3F2FD',    # Light blue
-            QueryNodeType.WITH_CLAUSE: '#E8F5E8',         # Light green
-            QueryNodeType.CTE: '#FFF3E0',                 # Light orange
-            QueryNodeType.SUBQUERY: '#F3E5F5',            # Light purple
-            QueryNodeType.TABLE_REFERENCE: '#F0F0F0'      # Light gray
-        }
-        
-        self.border_colors = {
-            QueryNodeType.SELECT_STATEMENT: '#1976D2',    # Blue
-            QueryNodeType.WITH_CLAUSE: '#388E3C',         # Green
-            QueryNodeType.CTE: '#F57C00',                 # Orange
-            QueryNodeType.SUBQUERY: '#7B1FA2',            # Purple
-            QueryNodeType.TABLE_REFERENCE: '#757575'      # Gray
+        # (fill color, border color, icon) per element type, looked up once per node
+        self.node_styles = {
+            QueryNodeType.SELECT_STATEMENT: ('#E3F2FD', '#1976D2', "🔍"),    # Blue
+            QueryNodeType.WITH_CLAUSE: ('#E8F5E8', '#388E3C', "📦"),         # Green
+            QueryNodeType.CTE: ('#FFF3E0', '#F57C00', "🔄"),                 # Orange
+            QueryNodeType.SUBQUERY: ('#F3E5F5', '#7B1FA2', "📊"),            # Purple
+            QueryNodeType.TABLE_REFERENCE: ('#F0F0F0', '#757575', "📋")      # Gray
         }
+        self.default_style = ('#FFFFFF', '#000000', "❓")
     
     def generate_diagram(self, data: Dict[str, Any], output_path: str):
         """Generate hierarchical diagram"""
@@ -400,15 +432,10 @@ class HierarchicalDiagramGenerator:
         max_level = data['max_level']
         summary = data['summary']
         
-        dot = graphviz.Digraph(comment='Hierarchical SQL Query Structure')
-        dot.attr(rankdir='LR')  # Left to right
-        dot.attr('node', shape='box', style='filled', fontname='Arial')
-        dot.attr('edge', fontname='Arial', fontsize='9')
-        dot.attr('graph', 
-                 splines='ortho',
-                 nodesep='1.2',
-                 ranksep='2.0',
-                 fontname='Arial')
+        dot = graphviz.Digraph(comment='Hierarchical SQL Query Structure',
+                               graph_attr=_GRAPH_ATTR,
+                               node_attr=_NODE_ATTR,
+                               edge_attr=_EDGE_ATTR)
         
         # Add title
         title = f"SQL Query Hierarchy\\n{summary.get('total_elements', 0)} Elements, {max_level + 1} Levels"
@@ -426,8 +453,11 @@ class HierarchicalDiagramGenerator:
         
         # Render
         try:
-            dot.render(output_path, format='svg', cleanup=True)
-            dot.render(output_path, format='png', cleanup=True)
+            svg_path = dot.render(output_path, format='svg', cleanup=True)
+            if cairosvg is not None:
+                cairosvg.svg2png(url=svg_path, write_to=f"{output_path}.png")
+            else:
+                dot.render(output_path, format='png', cleanup=True)
             print(f"✅ Hierarchical diagram saved: {output_path}.svg and {output_path}.png")
         except Exception as e:
             print(f"❌ Error generating diagram: {e}")
@@ -437,10 +467,9 @@ class HierarchicalDiagramGenerator:
         for level in sorted(hierarchy_levels.keys()):
             element_ids = hierarchy_levels[level]
             
-            # Create subgraph for this level
-            with dot.subgraph() as level_graph:
-                level_graph.attr(rank='same')
-                level_graph.attr(label=f'Level {level}', style='dashed', color='gray')
+            # Create subgraph for this level, with all attributes in a single graph statement
+            level_attrs = {'rank': 'same', 'label': f'Level {level}', 'style': 'dashed', 'color': 'gray'}
+            with dot.subgraph(graph_attr=level_attrs) as level_graph:
                 
                 for element_id in element_ids:
                     if element_id in elements:
@@ -449,11 +478,10 @@ class HierarchicalDiagramGenerator:
     
     def _add_element_node(self, graph, element: QueryElement):
         """Add a node for a query element"""
-        fill_color = self.node_colors.get(element.node_type, '#FFFFFF')
-        border_color = self.border_colors.get(element.node_type, '#000000')
+        fill_color, border_color, icon = self.node_styles.get(element.node_type, self.default_style)
         
         # Create label
-        label = self._create_element_label(element)
+        label = self._create_element_label(element, icon)
         
         graph.node(element.id,
                   label=label,
@@ -461,40 +489,23 @@ class HierarchicalDiagramGenerator:
                   color=border_color,
                   penwidth='2')
     
-    def _create_element_label(self, element: QueryElement) -> str:
+    def _create_element_label(self, element: QueryElement, icon: str) -> str:
         """Create label for query element"""
-        label_parts = []
-        
-        # Type icon and name
-        type_icons = {
-            QueryNodeType.SELECT_STATEMENT: "🔍",
-            QueryNodeType.WITH_CLAUSE: "📦",
-            QueryNodeType.CTE: "🔄",
-            QueryNodeType.SUBQUERY: "📊",
-            QueryNodeType.TABLE_REFERENCE: "📋"
-        }
-        
-        icon = type_icons.get(element.node_type, "❓")
-        label_parts.append(f"{icon} {element.alias}")
-        
-        # Add type
-        label_parts.append(f"({element.node_type.value.upper()})")
-        
-        # Add level
-        label_parts.append(f"Level {element.level}")
+        # Type icon and name, type, and level are always present
+        label = f"{icon} {element.alias}\\n({element.node_type.value.upper()})\\nLevel {element.level}"
         
         # Add tables if any
         if element.tables:
             tables_str = ", ".join(element.tables[:3])
             if len(element.tables) > 3:
                 tables_str += f" (+{len(element.tables) - 3})"
-            label_parts.append(f"Tables: {tables_str}")
+            label += f"\\nTables: {tables_str}"
         
         # Add children count
         if element.children_ids:
-            label_parts.append(f"Contains: {len(element.children_ids)} elements")
+            label += f"\\nContains: {len(element.children_ids)} elements"
         
-        return "\\n".join(label_parts)
+        return label
     
     def _add_containment_edges(self, dot, elements: Dict[str, QueryElement]):
         """Add edges showing containment relationships"""
@@ -536,11 +547,13 @@ def main(sql_file, sql, output, verbose):
     # Read SQL
     sql_content = ""
     if sql_file:
-        with open(sql_file, 'r') as f:
-            sql_content = f.read()
+        sql_content = Path(sql_file).read_text(encoding='utf-8')
     else:
         sql_content = sql
     
+    if len(sql_content) > LARGE_SQL_THRESHOLD:
+        click.echo(f"⚠️  Warning: large SQL input ({len(sql_content):,} characters), parsing may be slow")
+    
     # Parse with hierarchical understanding
     parser = HierarchicalSQLParser()
     data = parser.parse_query(sql_content)
@@ -6,18 +6,23 @@ Shows the difference between the original visualizer and the new join-focused ve
 
 import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def run_visualizer(script, sql_file, output_name, description):
-    """Run a visualizer and show results"""
+def run_visualizer(script, sql_file, output_name):
+    """Run a visualizer and capture its output"""
+    return subprocess.run([
+        'python', script, '-f', sql_file, '-o', output_name, '-v'
+    ], capture_output=True, text=True, cwd='/app')
+
+def show_visualizer_result(future, description):
+    """Wait for a visualizer run and show results"""
     print(f"\n{'='*60}")
     print(f"🔍 {description}")
     print(f"{'='*60}")
     
     try:
-        result = subprocess.run([
-            'python', script, '-f', sql_file, '-o', output_name, '-v'
-        ], capture_output=True, text=True, cwd='/app')
+        result = future.result()
         
         if result.returncode == 0:
             print("✅ Success!")
@@ -53,41 +58,42 @@ def main():
         }
     ]
     
-    for test_case in test_cases:
-        sql_file = test_case['file']
-        test_name = test_case['name']
-        description = test_case['description']
-        
-        print(f"\n\n🎯 TEST CASE: {test_name}")
-        print(f"Description: {description}")
-        print("=" * 80)
-        
-        # Show the SQL query
-        print(f"\n📝 SQL Query ({sql_file}):")
-        with open(f'/app/{sql_file}', 'r') as f:
-            sql_content = f.read()
-            # Show first few lines
-            lines = sql_content.strip().split('\n')
-            for i, line in enumerate(lines[:10], 1):
-                print(f"  {i:2d}: {line}")
-            if len(lines) > 10:
-                print(f"     ... ({len(lines) - 10} more lines)")
-        
-        # Test original advanced visualizer
-        run_visualizer(
-            'advanced_sql_visualizer.py',
-            sql_file,
-            f'comparison_original_{test_case["file"].replace(".sql", "")}',
-            f"Original Advanced Visualizer - {test_name}"
-        )
-        
-        # Test new join-focused visualizer  
-        run_visualizer(
-            'final_join_visualizer.py',
-            sql_file,
-            f'comparison_join_focused_{test_case["file"].replace(".sql", "")}',
-            f"NEW Join-Focused Visualizer - {test_name}"
-        )
+    # Each visualizer runs in its own process, so start every run up front and report in order
+    with ThreadPoolExecutor(max_workers=2 * len(test_cases)) as executor:
+        runs = []
+        for test_case in test_cases:
+            sql_file = test_case['file']
+            file_stem = test_case["file"].replace(".sql", "")
+            runs.append((
+                executor.submit(run_visualizer, 'advanced_sql_visualizer.py', sql_file, f'comparison_original_{file_stem}'),
+                executor.submit(run_visualizer, 'final_join_visualizer.py', sql_file, f'comparison_join_focused_{file_stem}')
+            ))
+
+        for test_case, (original_run, join_focused_run) in zip(test_cases, runs):
+            sql_file = test_case['file']
+            test_name = test_case['name']
+            description = test_case['description']
+
+            print(f"\n\n🎯 TEST CASE: {test_name}")
+            print(f"Description: {description}")
+            print("=" * 80)
+
+            # Show the SQL query
+            print(f"\n📝 SQL Query ({sql_file}):")
+            with open(f'/app/{sql_file}', 'r') as f:
+                sql_content = f.read()
+                # Show first few lines
+                lines = sql_content.strip().split('\n')
+                for i, line in enumerate(lines[:10], 1):
+                    print(f"  {i:2d}: {line}")
+                if len(lines) > 10:
+                    print(f"     ... ({len(lines) - 10} more lines)")
+
+            # Test original advanced visualizer
+            show_visualizer_result(original_run, f"Original Advanced Visualizer - {test_name}")
+
+            # Test new join-focused visualizer  
+            show_visualizer_result(join_focused_run, f"NEW Join-Focused Visualizer - {test_name}")
     
     # Summary
     print(f"\n\n🎉 COMPARISON SUMMARY")
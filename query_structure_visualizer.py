@@ -9,12 +9,62 @@ import sqlglot
 from sqlglot import exp
 from dataclasses import dataclass, field
 from typing import Dict, List, Set, Tuple, Optional, Any
-import graphviz
 import click
 import re
+import os
+import sys
+import copy
+from functools import lru_cache
+from collections import Counter
+from pathlib import Path
+import subprocess
 from enum import Enum
 
 
+# Precompiled patterns for _clean_sql and the text-scanning fallback
+_LINE_COMMENT_RE = re.compile(r'--.*$', re.MULTILINE)
+_BLOCK_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_WHITESPACE_RE = re.compile(r'\s+')
+_WITH_START_RE = re.compile(r'\s*WITH\s+(?:RECURSIVE\s+)?', re.IGNORECASE)
+_CTE_HEADER_RE = re.compile(r'\s*(\w+)\s+AS\s*\(', re.IGNORECASE)
+_CTE_SEPARATOR_RE = re.compile(r'\s*,')
+_SUBQUERY_RE = re.compile(r'\(\s*(SELECT\s+.*?)\)', re.IGNORECASE | re.DOTALL)
+_CTE_ALIAS_BEFORE_RE = re.compile(r'\w+\s+AS\s*$')
+_FROM_RE = re.compile(r'FROM\s+(\w+)', re.IGNORECASE)
+_JOIN_RE = re.compile(r'JOIN\s+(\w+)', re.IGNORECASE)
+_JOIN_KEY_RE = re.compile(r'(\w+\.\w+)\s*=\s*(\w+\.\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _get_sqlglot_parser(dialect: str) -> Tuple[Any, Any]:
+    """Tokenizer and parser for a dialect, built once and reused for every query"""
+    sql_dialect = sqlglot.Dialect.get_or_raise(dialect or None)
+    return sql_dialect.tokenizer(), sql_dialect.parser()
+
+
+@lru_cache(maxsize=1024)
+def _extract_tables_cached(text: str) -> Tuple[str, ...]:
+    """Table names in a SQL text slice, memoized so repeated CTE/subquery bodies are scanned once"""
+    # Insertion-ordered dict removes duplicates while keeping first-seen order
+    tables = {}
+    
+    # Pattern for FROM table_name
+    for match in _FROM_RE.finditer(text):
+        tables[match.group(1)] = None
+    
+    # Pattern for JOIN table_name
+    for match in _JOIN_RE.finditer(text):
+        tables[match.group(1)] = None
+    
+    return tuple(tables)
+
+
+@lru_cache(maxsize=1024)
+def _extract_join_keys_cached(text: str) -> Tuple[str, ...]:
+    """table.column = table.column join keys in a SQL text slice, memoized like _extract_tables_cached"""
+    return tuple(f"{left} = {right}" for left, right in _JOIN_KEY_RE.findall(text))
+
+
 class StructureType(Enum):
     MAIN_QUERY = "main_query"
     CTE = "cte"
@@ -22,7 +72,7 @@ class StructureType(Enum):
     WITH_BLOCK = "with_block"
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryStructure:
     """Represents a query structure element"""
     id: str
@@ -36,7 +86,7 @@ class QueryStructure:
     sql_preview: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class StructureRelation:
     """Represents relationships between structures"""
     source_id: str
@@ -48,75 +98,205 @@ class StructureRelation:
 class QueryStructureParser:
     """Parser that identifies query structures and their relationships"""
     
-    def __init__(self):
+    # Structure types whose tables can reference a CTE
+    _QUERY_OR_SUBQUERY = frozenset({StructureType.MAIN_QUERY, StructureType.SUBQUERY})
+    
+    def __init__(self, dialect: str = ""):
+        self.dialect = dialect
         self.structures: Dict[str, QueryStructure] = {}
         self.relations: List[StructureRelation] = []
         self.level_groups: Dict[int, List[str]] = {}  # level -> structure_ids
+        self.max_level = 0
         
     def parse_query(self, sql: str) -> Dict[str, Any]:
         """Parse SQL to understand structure hierarchy"""
         try:
-            # Clean SQL
-            sql = self._clean_sql(sql)
-            
-            # Reset state
-            self.structures = {}
-            self.relations = []
-            self.level_groups = {}
-            
-            # Strategy: Parse from outside in, identifying encapsulation levels
-            self._identify_query_structures(sql)
-            
-            # Organize by progression levels
-            self._organize_progression_levels()
-            
-            # Identify relationships
-            self._identify_relationships()
-            
-            return {
-                'structures': self.structures,
-                'relations': self.relations,
-                'level_groups': self.level_groups,
-                'summary': self._create_summary()
-            }
-            
+            # Repeated queries (e.g. in a batch run) reuse the memoized result; callers get their own copy
+            result = copy.deepcopy(_parse_query_cached(sql, self.dialect))
         except Exception as e:
+            # Failures propagate out of the cached parse, so they are never memoized
             print(f"Error parsing query structure: {e}")
             import traceback
             traceback.print_exc()
-            return {'structures': {}, 'relations': [], 'level_groups': {}, 'summary': {}}
+            self.structures = {}
+            self.relations = []
+            self.level_groups = {}
+            self.max_level = 0
+            result = {'structures': {}, 'relations': [], 'level_groups': {}, 'summary': self._create_summary()}
+        
+        self.structures = result['structures']
+        self.relations = result['relations']
+        self.level_groups = result['level_groups']
+        self.max_level = result['summary'].get('max_level', 0)
+        
+        return result
+    
+    def _parse_query_uncached(self, sql: str) -> Dict[str, Any]:
+        """Parse SQL and build the structure hierarchy from scratch (raises on failure)"""
+        # Clean SQL
+        sql = self._clean_sql(sql)
+        
+        # Reset state
+        self.structures = {}
+        self.relations = []
+        self.level_groups = {}
+        self.max_level = 0
+        
+        # Strategy: Parse from outside in, identifying encapsulation levels
+        has_nested = self._identify_query_structures(sql)
+        
+        # Organize by progression levels
+        self._organize_progression_levels()
+        
+        # Identify relationships (a flat query has no CTEs or subqueries to relate)
+        if has_nested:
+            self._identify_relationships()
+        
+        return {
+            'structures': self.structures,
+            'relations': self.relations,
+            'level_groups': self.level_groups,
+            'summary': self._create_summary()
+        }
     
     def _clean_sql(self, sql: str) -> str:
         """Clean and normalize SQL"""
-        # Remove comments
-        sql = re.sub(r'--.*$', '', sql, flags=re.MULTILINE)
-        sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
+        # Remove comments (the substring checks skip a full regex pass when there are none)
+        if '--' in sql:
+            sql = _LINE_COMMENT_RE.sub('', sql)
+        if '/*' in sql:
+            sql = _BLOCK_COMMENT_RE.sub('', sql)
         # Normalize whitespace
-        sql = re.sub(r'\s+', ' ', sql.strip())
+        sql = _WHITESPACE_RE.sub(' ', sql.strip())
         return sql
     
-    def _identify_query_structures(self, sql: str):
-        """Identify all query structures in order of encapsulation"""
+    def _identify_query_structures(self, sql: str) -> bool:
+        """Identify all query structures in order of encapsulation.
+        
+        Returns False when the query cannot contain CTEs or subqueries.
+        """
+        # Without a WITH clause or any parenthesis there can be no CTEs or subqueries
+        has_nested = '(' in sql or _WITH_START_RE.match(sql) is not None
+        
+        tokenizer, sql_parser = _get_sqlglot_parser(self.dialect)
+        try:
+            statements = sql_parser.parse(tokenizer.tokenize(sql), sql)
+        except sqlglot.errors.SqlglotError:
+            statements = []
+        
+        # Same result shape as sqlglot.parse_one
+        if not statements or statements[0] is None:
+            tree = None
+        elif len(statements) > 1:
+            tree = exp.Block(expressions=statements)
+        else:
+            tree = statements[0]
+        
+        if tree is not None:
+            # Single walk over the parsed AST
+            all_structures = self._identify_structures_from_ast(tree, sql, has_nested)
+        else:
+            # Fall back to text scanning for SQL that sqlglot cannot parse
+            all_structures = self._identify_structures_from_text(sql, has_nested)
+        
+        # Add valid structures
+        for structure in all_structures:
+            if structure:
+                self.structures[structure.id] = structure
+        
+        return has_nested
+    
+    def _identify_structures_from_ast(self, tree: exp.Expression, sql: str, has_nested: bool = True) -> List[QueryStructure]:
+        """Identify CTEs, the main SELECT and subqueries from the sqlglot AST"""
+        # Level 0: Find main structure (WITH blocks or main SELECT)
+        structures = [self._identify_main_structure(sql)]
+        
+        # Collect CTEs and subquery bodies in one depth-first (source order) walk
+        ctes = []
+        subqueries = []
+        for node in (tree.walk(bfs=False) if has_nested else ()):
+            if isinstance(node, exp.CTE):
+                ctes.append(node)
+            elif isinstance(node, exp.Subquery):
+                subqueries.append(node.this)
+            elif isinstance(node, exp.Exists) and not isinstance(node.this, exp.Subquery):
+                # EXISTS (SELECT ...) holds its SELECT directly, with no Subquery wrapper
+                subqueries.append(node.this)
+        
+        # Level 1: CTEs
+        for i, cte in enumerate(ctes):
+            cte_name = cte.alias_or_name
+            tables = self._extract_tables_from_node(cte.this)
+            structures.append(QueryStructure(
+                id=f"cte_{i}",
+                structure_type=StructureType.CTE,
+                name=cte_name,
+                level=1,
+                nesting_depth=1,
+                tables=tables,
+                join_keys=self._extract_join_keys_from_node(cte.this),
+                sql_preview=f"{cte_name} AS (SELECT ... FROM {', '.join(tables[:2])})"
+            ))
+        
+        # Level 2: Main SELECT, excluding the bodies of its CTEs
+        outside_ctes = lambda node: isinstance(node, exp.With)
+        # Detach the WITH clause just for this render so the CTE bodies are not generated
+        # again (cheaper than copying the tree); the walks below expect it back in place
+        with_clause = tree.args.get('with_')
+        if with_clause:
+            tree.set('with_', None)
+        try:
+            select_content = tree.sql()
+        finally:
+            if with_clause:
+                tree.set('with_', with_clause)
+        structures.append(self._create_main_select_structure(
+            select_content,
+            self._extract_tables_from_node(tree, prune=outside_ctes),
+            self._extract_join_keys_from_node(tree, prune=outside_ctes)
+        ))
+        
+        # Level 3: Subqueries anywhere in the query
+        for i, subquery in enumerate(subqueries):
+            subquery_content = subquery.sql()
+            structures.append(QueryStructure(
+                id=f"subquery_{i}",
+                structure_type=StructureType.SUBQUERY,
+                name=f"Subquery {i+1}",
+                level=3,
+                nesting_depth=2,
+                tables=self._extract_tables_from_node(subquery),
+                join_keys=self._extract_join_keys_from_node(subquery),
+                sql_preview=subquery_content[:60] + "..." if len(subquery_content) > 60 else subquery_content
+            ))
+        
+        return structures
+    
+    def _identify_structures_from_text(self, sql: str, has_nested: bool = True) -> List[QueryStructure]:
+        """Identify query structures by scanning the SQL text"""
         
         # Level 0: Find main structure (WITH blocks or main SELECT)
         main_structure = self._identify_main_structure(sql)
         
         # Level 1: Find WITH clauses and their CTEs
-        with_structures = self._identify_with_structures(sql)
-        
-        # Level 2: Find main SELECT statements
-        select_structures = self._identify_select_structures(sql)
+        ctes, select_start = self._scan_ctes(sql) if has_nested else ([], 0)
+        with_structures = self._identify_with_structures(ctes)
+        
+        # Level 2: The main SELECT is whatever follows the WITH clause
+        select_content = sql[select_start:].strip().rstrip(';').rstrip()
+        select_structures = []
+        if select_content:
+            select_structures.append(self._create_main_select_structure(
+                select_content,
+                self._extract_tables_from_text(select_content),
+                self._extract_join_keys_from_text(select_content)
+            ))
         
         # Level 3: Find subqueries within SELECTs
-        subquery_structures = self._identify_subquery_structures(sql)
+        subquery_structures = self._identify_subquery_structures(sql) if has_nested else []
         
         # Combine all structures
-        all_structures = [main_structure] + with_structures + select_structures + subquery_structures
-        
-        # Add valid structures
-        for structure in all_structures:
-            if structure:
-                self.structures[structure.id] = structure
+        return [main_structure] + with_structures + select_structures + subquery_structures
     
     def _identify_main_structure(self, sql: str) -> Optional[QueryStructure]:
         """Identify the main query structure"""
@@ -141,95 +321,88 @@ class QueryStructureParser:
                 sql_preview=sql[:100] + "..." if len(sql) > 100 else sql
             )
     
-    def _identify_with_structures(self, sql: str) -> List[QueryStructure]:
+    def _identify_with_structures(self, ctes: List[Tuple[str, str]]) -> List[QueryStructure]:
         """Identify WITH clauses and CTEs"""
         structures = []
         
-        # Find WITH clause
-        with_match = re.search(r'WITH\s+(.+?)(?=\s+SELECT\s+.*?FROM)', sql, re.IGNORECASE | re.DOTALL)
-        if not with_match:
-            return structures
-        
-        with_content = with_match.group(1)
-        
-        # Split CTEs by comma (but not commas inside parentheses)
-        cte_parts = self._split_ctes(with_content)
-        
-        for i, cte_part in enumerate(cte_parts):
-            # Extract CTE name and content
-            cte_match = re.match(r'\s*(\w+)\s+AS\s*\((.+)\)', cte_part.strip(), re.IGNORECASE | re.DOTALL)
-            if cte_match:
-                cte_name = cte_match.group(1)
-                cte_content = cte_match.group(2)
-                
-                structure = QueryStructure(
-                    id=f"cte_{i}",
-                    structure_type=StructureType.CTE,
-                    name=cte_name,
-                    level=1,
-                    nesting_depth=1,
-                    tables=self._extract_tables_from_text(cte_content),
-                    join_keys=self._extract_join_keys_from_text(cte_content),
-                    sql_preview=f"{cte_name} AS (SELECT ... FROM {', '.join(self._extract_tables_from_text(cte_content)[:2])})"
-                )
-                structures.append(structure)
+        for i, (cte_name, cte_content) in enumerate(ctes):
+            structure = QueryStructure(
+                id=f"cte_{i}",
+                structure_type=StructureType.CTE,
+                name=cte_name,
+                level=1,
+                nesting_depth=1,
+                tables=self._extract_tables_from_text(cte_content),
+                join_keys=self._extract_join_keys_from_text(cte_content),
+                sql_preview=f"{cte_name} AS (SELECT ... FROM {', '.join(self._extract_tables_from_text(cte_content)[:2])})"
+            )
+            structures.append(structure)
         
         return structures
     
-    def _split_ctes(self, with_content: str) -> List[str]:
-        """Split multiple CTEs while respecting parentheses"""
+    def _scan_ctes(self, sql: str) -> Tuple[List[Tuple[str, str]], int]:
+        """Scan a leading WITH clause for (name, body) pairs in one linear pass.
+        
+        Returns the CTEs and the offset where the statement after the WITH clause starts.
+        """
         ctes = []
-        current_cte = ""
-        paren_depth = 0
         
-        i = 0
-        while i < len(with_content):
-            char = with_content[i]
+        with_match = _WITH_START_RE.match(sql)
+        if not with_match:
+            return ctes, 0
+        
+        i = with_match.end()
+        select_start = i
+        while True:
+            # Each CTE starts with "<name> AS ("
+            header_match = _CTE_HEADER_RE.match(sql, i)
+            if not header_match:
+                break
             
-            if char == '(':
-                paren_depth += 1
-            elif char == ')':
-                paren_depth -= 1
-            elif char == ',' and paren_depth == 0:
-                # This comma is at the top level, so it separates CTEs
-                if current_cte.strip():
-                    ctes.append(current_cte.strip())
-                current_cte = ""
+            # Track parenthesis depth (ignoring quoted text) to find the closing paren of the body
+            body_start = header_match.end()
+            i = body_start
+            paren_depth = 1
+            quote_char = None
+            while i < len(sql) and paren_depth:
+                char = sql[i]
+                if quote_char:
+                    if char == quote_char:
+                        quote_char = None
+                elif char in ("'", '"'):
+                    quote_char = char
+                elif char == '(':
+                    paren_depth += 1
+                elif char == ')':
+                    paren_depth -= 1
                 i += 1
-                continue
             
-            current_cte += char
-            i += 1
-        
-        # Add the last CTE
-        if current_cte.strip():
-            ctes.append(current_cte.strip())
-        
-        return ctes
-    
-    def _identify_select_structures(self, sql: str) -> List[QueryStructure]:
-        """Identify main SELECT statements"""
-        structures = []
-        
-        # Find the main SELECT (after WITH clause if present)
-        main_select_match = re.search(r'(?:WITH.*?)?(?:^|\s)(SELECT\s+.*?)(?:\s*;|\s*$)', sql, re.IGNORECASE | re.DOTALL)
-        
-        if main_select_match:
-            select_content = main_select_match.group(1) if main_select_match.lastindex else main_select_match.group(0)
+            if paren_depth:
+                break  # Unbalanced parentheses
             
-            structure = QueryStructure(
-                id="main_select_0",
-                structure_type=StructureType.MAIN_QUERY,
-                name="Main SELECT",
-                level=2,
-                nesting_depth=1,
-                tables=self._extract_tables_from_text(select_content),
-                join_keys=self._extract_join_keys_from_text(select_content),
-                sql_preview=select_content[:100] + "..." if len(select_content) > 100 else select_content
-            )
-            structures.append(structure)
+            ctes.append((header_match.group(1), sql[body_start:i - 1].strip()))
+            select_start = i
+            
+            # A top-level comma separates CTEs; anything else ends the WITH clause
+            separator_match = _CTE_SEPARATOR_RE.match(sql, i)
+            if not separator_match:
+                break
+            i = separator_match.end()
         
-        return structures
+        return ctes, select_start
+    
+    def _create_main_select_structure(self, select_content: str, tables: List[str], join_keys: List[str]) -> QueryStructure:
+        """Create the structure for the main SELECT statement"""
+        return QueryStructure(
+            id="main_select_0",
+            structure_type=StructureType.MAIN_QUERY,
+            name="Main SELECT",
+            level=2,
+            nesting_depth=1,
+            tables=tables,
+            join_keys=join_keys,
+            sql_preview=select_content[:100] + "..." if len(select_content) > 100 else select_content
+        )
     
     def _identify_subquery_structures(self, sql: str) -> List[QueryStructure]:
         """Identify subqueries within the SQL"""
@@ -237,15 +410,24 @@ class QueryStructureParser:
         
         # Find subqueries in parentheses
         # Look for (SELECT ... FROM ...)
-        subquery_pattern = r'\(\s*(SELECT\s+.*?)\)'
-        subquery_matches = re.findall(subquery_pattern, sql, re.IGNORECASE | re.DOTALL)
-        
-        for i, subquery_content in enumerate(subquery_matches):
-            # Skip if this is likely a CTE (has AS before it)
-            context_before = sql[:sql.find(subquery_content)]
-            if re.search(r'\w+\s+AS\s*$', context_before):
+        search_pos = 0
+        while True:
+            subquery_match = _SUBQUERY_RE.search(sql, search_pos)
+            if not subquery_match:
+                break
+            
+            # Skip if this is likely a CTE (has AS right before the opening paren),
+            # resuming just inside it so subqueries within the CTE body are still found
+            paren_start = subquery_match.start()
+            context_before = sql[max(0, paren_start - 32):paren_start]
+            if _CTE_ALIAS_BEFORE_RE.search(context_before):
+                search_pos = paren_start + 1
                 continue  # This is a CTE, not a subquery
             
+            search_pos = subquery_match.end()
+            subquery_content = subquery_match.group(1)
+            i = len(structures)
+            
             structure = QueryStructure(
                 id=f"subquery_{i}",
                 structure_type=StructureType.SUBQUERY,
@@ -260,86 +442,94 @@ class QueryStructureParser:
         
         return structures
     
-    def _extract_tables_from_text(self, text: str) -> List[str]:
-        """Extract table names from SQL text"""
-        tables = []
-        
-        # Pattern for FROM table_name
-        from_pattern = r'FROM\s+(\w+)'
-        from_matches = re.findall(from_pattern, text, re.IGNORECASE)
-        tables.extend(from_matches)
-        
-        # Pattern for JOIN table_name
-        join_pattern = r'JOIN\s+(\w+)'
-        join_matches = re.findall(join_pattern, text, re.IGNORECASE)
-        tables.extend(join_matches)
-        
-        return list(set(tables))  # Remove duplicates
+    def _extract_tables_from_node(self, node: exp.Expression, prune=None) -> List[str]:
+        """Extract table names referenced under an AST node"""
+        tables = [table.name for table in node.walk(bfs=False, prune=prune) if isinstance(table, exp.Table) and table.name]
+        return list(dict.fromkeys(tables))  # Remove duplicates, keep first-seen order
     
-    def _extract_join_keys_from_text(self, text: str) -> List[str]:
-        """Extract join keys from SQL text"""
+    def _extract_join_keys_from_node(self, node: exp.Expression, prune=None) -> List[str]:
+        """Extract table.column = table.column join keys under an AST node"""
         join_keys = []
         
-        # Pattern for table.column = table.column
-        join_pattern = r'(\w+\.\w+)\s*=\s*(\w+\.\w+)'
-        join_matches = re.findall(join_pattern, text, re.IGNORECASE)
-        
-        for left, right in join_matches:
-            join_keys.append(f"{left} = {right}")
+        for eq in node.walk(bfs=False, prune=prune):
+            if not isinstance(eq, exp.EQ):
+                continue
+            left, right = eq.this, eq.expression
+            if isinstance(left, exp.Column) and isinstance(right, exp.Column) and left.table and right.table:
+                join_keys.append(f"{left.table}.{left.name} = {right.table}.{right.name}")
         
         return join_keys
     
+    def _extract_tables_from_text(self, text: str) -> List[str]:
+        """Extract table names from SQL text"""
+        return list(_extract_tables_cached(text))
+    
+    def _extract_join_keys_from_text(self, text: str) -> List[str]:
+        """Extract join keys from SQL text"""
+        return list(_extract_join_keys_cached(text))
+    
     def _organize_progression_levels(self):
         """Organize structures by their progression levels"""
         for structure in self.structures.values():
             level = structure.level
             if level not in self.level_groups:
                 self.level_groups[level] = []
+                self.max_level = max(self.max_level, level)
             self.level_groups[level].append(structure.id)
     
     def _identify_relationships(self):
         """Identify relationships between structures"""
+        with_blocks = [s for s in self.structures.values() if s.structure_type == StructureType.WITH_BLOCK]
+        cte_ids = {s.name: s.id for s in self.structures.values() if s.structure_type == StructureType.CTE}
+        
         # Containment relationships
+        for structure in with_blocks:
+            # WITH block contains CTEs
+            for other_id in cte_ids.values():
+                structure.contains.append(other_id)
+                self.relations.append(StructureRelation(
+                    source_id=structure.id,
+                    target_id=other_id,
+                    relation_type="contains",
+                    details="WITH contains CTE"
+                ))
+        
+        # Table usage relationships: queries and subqueries that read from a CTE
         for structure in self.structures.values():
-            if structure.structure_type == StructureType.WITH_BLOCK:
-                # WITH block contains CTEs
-                for other_id, other in self.structures.items():
-                    if other.structure_type == StructureType.CTE:
-                        structure.contains.append(other_id)
+            if structure.structure_type in self._QUERY_OR_SUBQUERY:
+                for table in structure.tables:
+                    other_id = cte_ids.get(table)
+                    if other_id and other_id != structure.id:
                         self.relations.append(StructureRelation(
-                            source_id=structure.id,
-                            target_id=other_id,
-                            relation_type="contains",
-                            details="WITH contains CTE"
+                            source_id=other_id,
+                            target_id=structure.id,
+                            relation_type="feeds_into",
+                            details=f"CTE '{table}' used in query"
                         ))
-        
-        # Table usage relationships
-        for structure in self.structures.values():
-            for other_id, other in self.structures.items():
-                if structure.id != other_id:
-                    # Check if structure uses tables defined in other
-                    if structure.structure_type in [StructureType.MAIN_QUERY, StructureType.SUBQUERY]:
-                        if other.structure_type == StructureType.CTE and other.name in ' '.join(structure.tables):
-                            self.relations.append(StructureRelation(
-                                source_id=other_id,
-                                target_id=structure.id,
-                                relation_type="feeds_into",
-                                details=f"CTE '{other.name}' used in query"
-                            ))
     
     def _create_summary(self) -> Dict[str, Any]:
         """Create summary of the structure analysis"""
+        type_counts = Counter(s.structure_type for s in self.structures.values())
         return {
             'total_structures': len(self.structures),
-            'max_level': max(self.level_groups.keys()) if self.level_groups else 0,
-            'structures_by_type': {
-                st.value: len([s for s in self.structures.values() if s.structure_type == st])
-                for st in StructureType
-            },
+            'max_level': self.max_level,
+            'structures_by_type': {st.value: type_counts[st] for st in StructureType},
             'total_relations': len(self.relations)
         }
 
 
+@lru_cache(maxsize=200)
+def _parse_query_cached(sql: str, dialect: str) -> Dict[str, Any]:
+    """Parse once per (sql, dialect) pair; QueryStructureParser.parse_query hands out copies"""
+    return QueryStructureParser(dialect)._parse_query_uncached(sql)
+
+
+def _dot_attrs(**attrs: str) -> str:
+    """Format DOT attributes as key="value" pairs; label escapes such as \\n pass through unchanged"""
+    quoted = (value.replace('"', '\\"') for value in attrs.values())
+    return ' '.join(f'{key}="{value}"' for key, value in zip(attrs, quoted))
+
+
 class StructureDiagramGenerator:
     """Generates diagrams showing query structure progression"""
     
@@ -358,37 +548,47 @@ class StructureDiagramGenerator:
         level_groups = data['level_groups']
         summary = data['summary']
         
-        dot = graphviz.Digraph(comment='SQL Query Structure Progression')
-        dot.attr(rankdir='LR')  # Left to right progression
-        dot.attr('node', shape='box', style='filled', fontname='Arial')
-        dot.attr('edge', fontname='Arial', fontsize='9')
-        dot.attr('graph', 
-                 splines='ortho',
-                 nodesep='1.5',
-                 ranksep='2.5',
-                 fontname='Arial')
+        # DOT source is assembled as plain lines and written out in one go
+        lines = [
+            "// SQL Query Structure Progression",
+            "digraph {",
+            "\trankdir=LR",  # Left to right progression
+            f"\tnode [{_dot_attrs(fontname='Arial', shape='box', style='filled')}]",
+            f"\tedge [{_dot_attrs(fontname='Arial', fontsize='9')}]",
+            f"\tgraph [{_dot_attrs(fontname='Arial', nodesep='1.5', ranksep='2.5', splines='ortho')}]",
+        ]
         
         # Title
         title = f"Query Structure Progression\\n{summary['total_structures']} Structures, {summary['max_level'] + 1} Levels"
-        dot.attr(label=title, labelloc='top', fontsize='14')
+        lines.append(f"\t{_dot_attrs(fontsize='14', label=title, labelloc='top')}")
         
         # Create level-based columns
         for level in sorted(level_groups.keys()):
-            with dot.subgraph() as level_subgraph:
-                level_subgraph.attr(rank='same')
-                
-                for structure_id in level_groups[level]:
-                    structure = structures[structure_id]
-                    self._add_structure_node(level_subgraph, structure)
+            lines.append("\t{")
+            lines.append("\t\trank=same")
+            for structure_id in level_groups[level]:
+                structure = structures[structure_id]
+                self._add_structure_node(lines, structure)
+            lines.append("\t}")
         
         # Add relationships
         for relation in relations:
-            self._add_relation_edge(dot, relation, structures)
+            self._add_relation_edge(lines, relation, structures)
+        
+        lines.append("}")
         
-        # Render
+        # Render both formats from a single layout pass
         try:
-            dot.render(output_path, format='svg', cleanup=True)
-            dot.render(output_path, format='png', cleanup=True)
+            source_path = f"{output_path}.gv"
+            with open(source_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            try:
+                subprocess.run(
+                    ['dot', '-Tsvg', '-o', f"{output_path}.svg", '-Tpng', '-o', f"{output_path}.png", source_path],
+                    check=True, capture_output=True
+                )
+            finally:
+                os.remove(source_path)
             print(f"✅ Structure diagram saved: {output_path}.svg and {output_path}.png")
         except Exception as e:
             print(f"⚠️  Graphviz error: {e}")
@@ -452,7 +652,7 @@ class StructureDiagramGenerator:
         
         print("\n" + "=" * 70)
     
-    def _add_structure_node(self, graph, structure: QueryStructure):
+    def _add_structure_node(self, lines: List[str], structure: QueryStructure):
         """Add a node for a query structure"""
         color = self.colors.get(structure.structure_type, '#F0F0F0')
         
@@ -490,49 +690,20 @@ class StructureDiagramGenerator:
         
         label = "\\n".join(label_parts)
         
-        graph.node(structure.id, label=label, fillcolor=color)
+        lines.append(f'\t\t"{structure.id}" [{_dot_attrs(label=label, fillcolor=color)}]')
     
-    def _add_relation_edge(self, dot, relation: StructureRelation, structures: Dict[str, QueryStructure]):
+    def _add_relation_edge(self, lines: List[str], relation: StructureRelation, structures: Dict[str, QueryStructure]):
         """Add edge for structure relationship"""
         if relation.source_id in structures and relation.target_id in structures:
             style = 'dashed' if relation.relation_type == 'contains' else 'solid'
             color = 'blue' if relation.relation_type == 'feeds_into' else 'gray'
             
-            dot.edge(relation.source_id, relation.target_id,
-                    label=relation.relation_type.replace('_', ' '),
-                    style=style,
-                    color=color)
+            attrs = _dot_attrs(label=relation.relation_type.replace('_', ' '), color=color, style=style)
+            lines.append(f'\t"{relation.source_id}" -> "{relation.target_id}" [{attrs}]')
 
 
-@click.command()
-@click.option('--sql-file', '-f', type=click.Path(exists=True), help='Path to SQL file')
-@click.option('--sql', '-s', type=str, help='SQL query string')
-@click.option('--output', '-o', default='query_structure', help='Output file name')
-@click.option('--verbose', '-v', is_flag=True, help='Show detailed structure information')
-def main(sql_file, sql, output, verbose):
-    """Query Structure Visualizer - Shows hierarchical SQL structure"""
-    
-    if not sql_file and not sql:
-        click.echo("Error: Must provide either --sql-file or --sql")
-        return
-    
-    # Read SQL
-    sql_content = ""
-    if sql_file:
-        with open(sql_file, 'r') as f:
-            sql_content = f.read()
-    else:
-        sql_content = sql
-    
-    # Parse structure
-    parser = QueryStructureParser()
-    data = parser.parse_query(sql_content)
-    
-    # Generate diagram
-    visualizer = StructureDiagramGenerator()
-    visualizer.generate_diagram(data, output)
-    
-    # Print analysis
+def _print_analysis(data: Dict[str, Any], verbose: bool):
+    """Print the structure summary (and per-level detail when verbose)"""
     summary = data['summary']
     click.echo(f"\n📊 Query Structure Analysis:")
     click.echo(f"   Total Structures: {summary['total_structures']}")
@@ -561,5 +732,58 @@ def main(sql_file, sql, output, verbose):
                     click.echo(f"       Joins: {', '.join(structure.join_keys)}")
 
 
+@click.command()
+@click.option('--sql-file', '-f', type=click.Path(exists=True), help='Path to SQL file')
+@click.option('--sql', '-s', type=str, help='SQL query string')
+@click.option('--output', '-o', default='query_structure', help='Output file name')
+@click.option('--dialect', '-d', default='', help='SQL dialect to parse with (default: sqlglot generic)')
+@click.option('--verbose', '-v', is_flag=True, help='Show detailed structure information')
+@click.option('--batch', is_flag=True, hidden=True,
+              help='Read SQL file paths from stdin (one per line) and visualize each with one parser')
+def main(sql_file, sql, output, dialect, verbose, batch):
+    """Query Structure Visualizer - Shows hierarchical SQL structure"""
+    
+    parser = QueryStructureParser(dialect)
+    visualizer = StructureDiagramGenerator()
+    
+    if batch:
+        # One parser/generator for all files, so sqlglot setup is paid once
+        for line in sys.stdin:
+            path = line.strip()
+            if not path:
+                continue
+            # A bad path is reported and skipped so the rest of the batch still runs
+            try:
+                sql_content = Path(path).read_text(encoding='utf-8')
+            except (OSError, UnicodeDecodeError) as e:
+                click.echo(f"\n❌ {path}: {e}")
+                continue
+            data = parser.parse_query(sql_content)
+            click.echo(f"\n📄 {path}")
+            visualizer.generate_diagram(data, f"{output}_{os.path.splitext(os.path.basename(path))[0]}")
+            _print_analysis(data, verbose)
+        return
+    
+    if not sql_file and not sql:
+        click.echo("Error: Must provide either --sql-file or --sql")
+        return
+    
+    # Read SQL
+    sql_content = ""
+    if sql_file:
+        sql_content = Path(sql_file).read_text(encoding='utf-8')
+    else:
+        sql_content = sql
+    
+    # Parse structure
+    data = parser.parse_query(sql_content)
+    
+    # Generate diagram
+    visualizer.generate_diagram(data, output)
+    
+    # Print analysis
+    _print_analysis(data, verbose)
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
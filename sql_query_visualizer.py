@@ -7,14 +7,17 @@ relationships, and data flow.
 
 import sqlglot
 from sqlglot import exp
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict
 from typing import Dict, List, Set, Tuple, Optional, Any
-import networkx as nx
-import graphviz
 import click
-import json
 from pathlib import Path
-import re
+import os
+import copy
+import subprocess
+import hashlib
+import json
+import tempfile
+from functools import lru_cache
 from enum import Enum
 
 
@@ -35,7 +38,7 @@ class JoinType(Enum):
     CROSS = "CROSS"
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryNode:
     """Represents a node in the query graph (table, CTE, etc.)"""
     name: str
@@ -45,19 +48,15 @@ class QueryNode:
     level: int = 0  # For nested CTEs
     parent_cte: str = ""  # If this is nested within a CTE
     schema: str = ""
-    
-    def __post_init__(self):
-        if not self.alias:
-            self.alias = self.name
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class QueryEdge:
     """Represents a relationship between nodes"""
     source: str
     target: str
     join_type: Optional[JoinType] = None
-    join_keys: List[Tuple[str, str]] = field(default_factory=list)  # (source_col, target_col)
+    join_keys: Tuple[Tuple[str, str], ...] = ()  # (source_col, target_col)
     edge_type: str = "data_flow"  # data_flow, join, cte_dependency
 
 
@@ -67,28 +66,43 @@ class SQLQueryParser:
     def __init__(self, dialect: str = ""):
         self.dialect = dialect
         self.nodes: Dict[str, QueryNode] = {}
-        self.edges: List[QueryEdge] = []
+        self.edges: Dict[Tuple[str, str, str], QueryEdge] = {}  # (source, target, edge_type) -> edge
         self.cte_hierarchy: Dict[str, List[str]] = {}  # CTE -> nested CTEs
         
     def parse_query(self, sql: str) -> Dict[str, Any]:
         """Parse SQL query and extract structure"""
+        # Identical queries reuse the memoized result; callers get their own copy
+        result = copy.deepcopy(_parse_query_cached(sql, self.dialect))
+        
+        self.nodes = result['nodes']
+        self.edges = result['edges']
+        self.cte_hierarchy = result['cte_hierarchy']
+        
+        return result
+    
+    def _parse_query_uncached(self, sql: str) -> Dict[str, Any]:
+        """Parse SQL query and extract structure from scratch"""
         try:
             # Parse the SQL
             parsed = sqlglot.parse_one(sql, dialect=self.dialect)
             
             # Reset state
             self.nodes = {}
-            self.edges = []
+            self.edges = {}
             self.cte_hierarchy = {}
+            self._cte_names: Set[str] = set()
+            
+            # Bucket the AST in a single pass
+            self._walk(parsed)
             
             # Extract CTEs first
-            self._extract_ctes(parsed)
+            self._extract_ctes()
             
             # Extract main query components
-            self._extract_main_query(parsed)
+            self._extract_main_query()
             
             # Build relationships
-            self._build_relationships(parsed)
+            self._build_relationships()
             
             return {
                 'nodes': self.nodes,
@@ -99,50 +113,94 @@ class SQLQueryParser:
         except Exception as e:
             raise Exception(f"Failed to parse SQL: {str(e)}")
     
-    def _extract_ctes(self, parsed_query, level: int = 0, parent_cte: str = ""):
+    def _walk(self, parsed_query):
+        """Collect the nodes every extraction step needs in one preorder walk"""
+        self._ctes = []  # (cte, level, parent_cte)
+        self._tables = []
+        self._subqueries = []
+        self._selects = []
+        # Per-CTE nodes found anywhere inside that CTE's body
+        self._cte_tables: Dict[str, List[exp.Table]] = {}
+        self._cte_identifiers: Dict[str, List[exp.Identifier]] = {}
+        self._cte_selects: Dict[str, List[exp.Select]] = {}
+        
+        # Each entry carries the names of the CTE bodies enclosing the node
+        stack = [(parsed_query, ())]
+        while stack:
+            node, scope = stack.pop()
+            body_scope = scope
+            
+            if isinstance(node, exp.CTE):
+                cte_name = node.alias
+                self._ctes.append((node, len(scope), scope[-1] if scope else ""))
+                body_scope = scope + (cte_name,)
+            elif isinstance(node, exp.Table):
+                self._tables.append(node)
+                for cte_name in scope:
+                    self._cte_tables.setdefault(cte_name, []).append(node)
+            elif isinstance(node, exp.Subquery):
+                self._subqueries.append(node)
+            elif isinstance(node, exp.Select):
+                self._selects.append(node)
+                for cte_name in scope:
+                    self._cte_selects.setdefault(cte_name, []).append(node)
+            
+            if isinstance(node, exp.Identifier):
+                for cte_name in scope:
+                    self._cte_identifiers.setdefault(cte_name, []).append(node)
+            
+            children = []
+            for key, value in node.args.items():
+                child_scope = body_scope if key == 'this' else scope
+                if isinstance(value, exp.Expression):
+                    children.append((value, child_scope))
+                elif isinstance(value, list):
+                    children.extend((v, child_scope) for v in value if isinstance(v, exp.Expression))
+            stack.extend(reversed(children))
+    
+    def _extract_ctes(self):
         """Extract Common Table Expressions"""
-        if not hasattr(parsed_query, 'find_all'):
-            return
+        for cte, level, parent_cte in self._ctes:
+            cte_name = cte.alias
             
-        # Find WITH clauses
-        with_clauses = parsed_query.find_all(exp.With)
-        
-        for with_clause in with_clauses:
-            for cte in with_clause.expressions:
-                if hasattr(cte, 'alias') and hasattr(cte, 'this'):
-                    cte_name = cte.alias
-                    cte_query = cte.this
-                    
-                    # Create CTE node
-                    node = QueryNode(
-                        name=cte_name,
-                        node_type=NodeType.CTE,
-                        alias=cte_name,
-                        level=level,
-                        parent_cte=parent_cte
-                    )
-                    
-                    # Extract columns from CTE query more comprehensively
-                    node.columns = self._extract_columns_from_query(cte_query)
-                    
-                    self.nodes[cte_name] = node
-                    
-                    # Track CTE hierarchy
-                    if parent_cte:
-                        if parent_cte not in self.cte_hierarchy:
-                            self.cte_hierarchy[parent_cte] = []
-                        self.cte_hierarchy[parent_cte].append(cte_name)
-                    
-                    # Recursively extract nested CTEs
-                    self._extract_ctes(cte_query, level + 1, cte_name)
+            # Create CTE node
+            node = QueryNode(
+                name=cte_name,
+                node_type=NodeType.CTE,
+                alias=cte_name,
+                level=level,
+                parent_cte=parent_cte
+            )
+            
+            # Extract columns from CTE query more comprehensively
+            node.columns = self._extract_columns_from_query(self._cte_selects.get(cte_name, []))
+            
+            self.nodes[cte_name] = node
+            self._cte_names.add(cte_name)
+            
+            # Track CTE hierarchy
+            if parent_cte:
+                if parent_cte not in self.cte_hierarchy:
+                    self.cte_hierarchy[parent_cte] = []
+                self.cte_hierarchy[parent_cte].append(cte_name)
+        
+        # Tables/CTEs each CTE reads from, resolved once for _build_relationships
+        # (insertion-ordered dicts double as ordered sets)
+        self._cte_deps: Dict[str, Dict[str, None]] = {}
+        for cte_name in self.nodes:  # Only CTE nodes exist at this point
+            dependencies = dict.fromkeys(table.name for table in self._cte_tables.get(cte_name, []))
+            dependencies.update(dict.fromkeys(
+                identifier.name for identifier in self._cte_identifiers.get(cte_name, [])
+                if identifier.name in self._cte_names
+            ))
+            dependencies.pop(cte_name, None)  # Don't include self-reference
+            self._cte_deps[cte_name] = dependencies
     
-    def _extract_main_query(self, parsed_query):
+    def _extract_main_query(self):
         """Extract tables and derived tables from main query"""
-        # Find all table references
-        tables = parsed_query.find_all(exp.Table)
-        
-        for table in tables:
-            table_name = str(table.name) if hasattr(table, 'name') else str(table)
+        for table in self._tables:
+            # Table.name is the identifier's raw text; no SQL rendering needed
+            table_name = table.name
             
             # Skip if it's a CTE (already processed)
             if table_name in self.nodes:
@@ -150,212 +208,238 @@ class SQLQueryParser:
                 
             # Extract schema if present
             schema = ""
-            if hasattr(table, 'db') and table.db:
-                schema = str(table.db)
+            if table.db:
+                schema = table.db
             
             # Create table node
             node = QueryNode(
                 name=table_name,
                 node_type=NodeType.TABLE,
-                alias=str(table.alias) if hasattr(table, 'alias') and table.alias else table_name,
+                alias=table.alias_or_name,
                 schema=schema
             )
             
             self.nodes[table_name] = node
         
-        # Find subqueries
-        subqueries = parsed_query.find_all(exp.Subquery)
-        for i, subquery in enumerate(subqueries):
+        # Subqueries
+        for i, subquery in enumerate(self._subqueries):
             subquery_name = f"subquery_{i}"
-            alias = str(subquery.alias) if hasattr(subquery, 'alias') and subquery.alias else subquery_name
-            
             node = QueryNode(
                 name=subquery_name,
                 node_type=NodeType.SUBQUERY,
-                alias=alias
+                alias=subquery.alias or subquery_name
             )
             
             self.nodes[subquery_name] = node
     
-    def _build_relationships(self, parsed_query):
+    def _build_relationships(self):
         """Build relationships between nodes"""
         # Find all FROM and JOIN clauses to build comprehensive relationships
-        self._analyze_query_relationships(parsed_query)
+        self._analyze_query_relationships()
         
         # Build CTE dependencies
-        for cte_name in self.nodes:
-            if self.nodes[cte_name].node_type == NodeType.CTE:
-                # Find tables/CTEs referenced in this CTE
-                dependencies = self._find_cte_dependencies(parsed_query, cte_name)
-                for dep in dependencies:
-                    if dep in self.nodes and dep != cte_name:
-                        edge = QueryEdge(
-                            source=dep,
-                            target=cte_name,
-                            edge_type="cte_dependency"
-                        )
-                        self.edges.append(edge)
+        for cte_name, dependencies in self._cte_deps.items():
+            for dep in dependencies:
+                if dep in self.nodes:
+                    edge = QueryEdge(
+                        source=dep,
+                        target=cte_name,
+                        edge_type="cte_dependency"
+                    )
+                    self._add_edge(edge)
+    
+    def _add_edge(self, edge: QueryEdge):
+        """Record an edge, keeping the first one seen between the same nodes for the same purpose"""
+        self.edges.setdefault((edge.source, edge.target, edge.edge_type), edge)
     
-    def _analyze_query_relationships(self, parsed_query):
+    def _analyze_query_relationships(self):
         """Comprehensively analyze all relationships in the query"""
-        # Find all SELECT statements to analyze their FROM and JOIN clauses
-        select_statements = parsed_query.find_all(exp.Select)
-        
-        for select_stmt in select_statements:
-            if hasattr(select_stmt, 'from_') and select_stmt.from_:
-                self._analyze_from_clause(select_stmt.from_)
+        # Analyze the FROM and JOIN clauses of every SELECT statement
+        for select_stmt in self._selects:
+            # Read the args directly: Select.from_ is a builder method, not the clause
+            from_clause = select_stmt.args.get('from_')
+            if not isinstance(from_clause, exp.From):
+                continue
+            main_table = self._analyze_from_clause(from_clause)
                 
-            # Analyze joins
-            if hasattr(select_stmt, 'joins') and select_stmt.joins:
-                for join in select_stmt.joins:
-                    self._analyze_join(join)
+            # Analyze joins against the FROM table they extend
+            for join in select_stmt.args.get('joins') or []:
+                self._analyze_join(join, main_table)
     
-    def _analyze_from_clause(self, from_clause):
-        """Analyze FROM clause to find base relationships"""
-        if hasattr(from_clause, 'this'):
-            # This is the main table in FROM
-            main_table = self._extract_table_name(from_clause.this)
-            # FROM clause establishes base data flow - could add edges here if needed
+    def _analyze_from_clause(self, from_clause) -> str:
+        """Analyze FROM clause to find the main table joins hang off"""
+        return self._extract_table_name(from_clause.this)
     
-    def _analyze_join(self, join):
-        """Analyze individual join to extract relationships"""
-        join_type = self._get_join_type(join)
+    def _analyze_join(self, join, main_table: str):
+        """Add a join edge from the FROM table to the joined table"""
+        joined_table = self._extract_table_name(join.this)
         
-        # Get the joined table
-        joined_table = None
-        if hasattr(join, 'this'):
-            joined_table = self._extract_table_name(join.this)
+        # Only joins between known tables/CTEs become edges; subqueries are keyed by position
+        if main_table not in self.nodes or joined_table not in self.nodes or joined_table == main_table:
+            return
         
         # Extract join condition
         join_keys = []
-        if hasattr(join, 'on') and join.on:
-            join_keys = self._extract_join_keys(join.on)
-        
-        # For now, we'll create a simplified relationship
-        # In a more complex implementation, we'd track the specific tables being joined
-        if joined_table and joined_table in self.nodes:
-            # We'd need to determine the "source" table from context
-            # This is simplified - in practice, you'd track the FROM table chain
-            pass
+        on_condition = join.args.get('on')
+        if isinstance(on_condition, exp.Expression):
+            join_keys = self._extract_join_keys(on_condition)
+        
+        self._add_edge(QueryEdge(
+            source=main_table,
+            target=joined_table,
+            join_type=self._get_join_type(join),
+            join_keys=tuple(join_keys),
+            edge_type="join"
+        ))
     
     def _extract_table_name(self, table_expr):
         """Extract table name from various table expressions"""
-        if hasattr(table_expr, 'name'):
-            return str(table_expr.name)
-        elif hasattr(table_expr, 'this') and hasattr(table_expr.this, 'name'):
-            return str(table_expr.this.name)
+        if isinstance(table_expr, exp.Expression):
+            return table_expr.name
         return str(table_expr)
     
     def _get_join_type(self, join) -> JoinType:
         """Extract join type from join expression"""
-        if hasattr(join, 'kind') and join.kind:
-            join_kind = str(join.kind).upper()
-            if 'LEFT' in join_kind:
-                return JoinType.LEFT
-            elif 'RIGHT' in join_kind:
-                return JoinType.RIGHT
-            elif 'FULL' in join_kind:
-                return JoinType.FULL
-            elif 'CROSS' in join_kind:
-                return JoinType.CROSS
+        # LEFT/RIGHT/FULL are parsed into the join's side, INNER/CROSS into its kind
+        join_kind = f"{join.side} {join.kind}"
+        if 'LEFT' in join_kind:
+            return JoinType.LEFT
+        elif 'RIGHT' in join_kind:
+            return JoinType.RIGHT
+        elif 'FULL' in join_kind:
+            return JoinType.FULL
+        elif 'CROSS' in join_kind:
+            return JoinType.CROSS
         return JoinType.INNER
     
     def _extract_join_keys(self, join_condition) -> List[Tuple[str, str]]:
         """Extract join keys from join condition"""
         join_keys = []
         
-        # Convert to string and parse
-        condition_str = str(join_condition)
-        
-        # Look for equality conditions like table1.col = table2.col
-        equality_pattern = r'(\w+\.\w+)\s*=\s*(\w+\.\w+)'
-        matches = re.findall(equality_pattern, condition_str)
-        
-        for match in matches:
-            join_keys.append((match[0], match[1]))
-        
-        # Also look for simple column = column patterns
-        simple_pattern = r'(\w+)\s*=\s*(\w+)'
-        simple_matches = re.findall(simple_pattern, condition_str)
-        
-        for match in simple_matches:
-            if '.' not in match[0] and '.' not in match[1]:  # Simple column names
-                join_keys.append((match[0], match[1]))
+        # Multi-key joins are ANDed (possibly parenthesized) equalities; an EQ
+        # under OR or inside an expression does not pin the join to a key.
+        # AND chains are left-deep, so walk them with a stack rather than recursion.
+        stack = [join_condition]
+        while stack:
+            condition = stack.pop()
+            if isinstance(condition, exp.And):
+                # Right side pushed first so keys come out left to right
+                stack.append(condition.expression)
+                stack.append(condition.this)
+            elif isinstance(condition, exp.Paren):
+                stack.append(condition.this)
+            elif isinstance(condition, exp.EQ):
+                # Equality between two columns, e.g. table1.col = table2.col
+                left, right = condition.this, condition.expression
+                if isinstance(left, exp.Column) and isinstance(right, exp.Column):
+                    join_keys.append((self._qualified_column(left), self._qualified_column(right)))
         
         return join_keys
     
-    def _find_cte_dependencies(self, parsed_query, cte_name: str) -> List[str]:
-        """Find what tables/CTEs a given CTE depends on"""
-        dependencies = []
-        
-        # Find the CTE definition
-        with_clauses = parsed_query.find_all(exp.With)
-        for with_clause in with_clauses:
-            for cte in with_clause.expressions:
-                if hasattr(cte, 'alias') and str(cte.alias) == cte_name:
-                    # Find all table/CTE references in this CTE's query
-                    tables = cte.this.find_all(exp.Table)
-                    for table in tables:
-                        table_name = str(table.name) if hasattr(table, 'name') else str(table)
-                        if table_name != cte_name:  # Don't include self-reference
-                            dependencies.append(table_name)
-                    
-                    # Also find any CTE references
-                    identifiers = cte.this.find_all(exp.Identifier)
-                    for identifier in identifiers:
-                        identifier_name = str(identifier.name) if hasattr(identifier, 'name') else str(identifier)
-                        # Check if this identifier is a known CTE
-                        if identifier_name in self.nodes and self.nodes[identifier_name].node_type == NodeType.CTE:
-                            if identifier_name != cte_name and identifier_name not in dependencies:
-                                dependencies.append(identifier_name)
-        
-        return list(set(dependencies))  # Remove duplicates
+    def _qualified_column(self, column: exp.Column) -> str:
+        """schema.table.column as written, down to the bare column name when unqualified"""
+        return ".".join(part for part in (column.db, column.table, column.name) if part)
     
-    def _extract_columns_from_query(self, query) -> List[str]:
-        """Extract column names from a query"""
+    def _extract_columns_from_query(self, select_expressions) -> List[str]:
+        """Extract column names from the SELECT statements of a query"""
         columns = []
         
-        if not hasattr(query, 'find_all'):
-            return columns
-            
-        # Find SELECT expressions
-        select_expressions = query.find_all(exp.Select)
         for select_expr in select_expressions:
-            if hasattr(select_expr, 'expressions'):
-                for expr in select_expr.expressions:
-                    column_name = self._extract_column_name(expr)
-                    if column_name:
-                        columns.append(column_name)
+            for expr in select_expr.expressions:
+                column_name = self._extract_column_name(expr)
+                if column_name:
+                    columns.append(column_name)
         
         return list(set(columns))  # Remove duplicates
     
     def _extract_column_name(self, expression) -> Optional[str]:
         """Extract column name from a select expression"""
-        # Handle aliased expressions
-        if hasattr(expression, 'alias') and expression.alias:
-            return str(expression.alias)
-        
-        # Handle simple column references
-        if hasattr(expression, 'name'):
-            return str(expression.name)
-        
-        # Handle function calls and complex expressions
-        if hasattr(expression, 'this'):
-            if hasattr(expression.this, 'name'):
-                return str(expression.this.name)
-        
-        # Handle star expressions
-        if str(expression) == '*':
-            return '*'
-        
-        # For complex expressions, try to extract a meaningful name
-        expr_str = str(expression)
-        if len(expr_str) < 50:  # Only show short expressions
-            return expr_str
+        # The alias for aliased expressions, the column name (or '*') otherwise;
+        # functions and other complex expressions have no name
+        return expression.alias_or_name or None
+
+
+@lru_cache(maxsize=128)
+def _parse_query_cached(sql: str, dialect: str) -> Dict[str, Any]:
+    """Parse once per (sql, dialect) pair; SQLQueryParser.parse_query hands out copies"""
+    return SQLQueryParser(dialect)._parse_query_uncached(sql)
+
+
+# Bump whenever the layout of parse_query's result changes so older cache entries are ignored
+_CACHE_FORMAT = 2
+
+
+def _cache_path(cache_dir: str, sql: str, dialect: str) -> Path:
+    """Cache file for a (sql, dialect) pair under the current cache format"""
+    key = hashlib.sha256(f"{_CACHE_FORMAT}\n{dialect}\n{sql}".encode('utf-8')).hexdigest()
+    return Path(cache_dir) / f"{key}.json"
+
+
+def _load_cached_query_data(cache_file: Path) -> Optional[Dict[str, Any]]:
+    """Query data stored by _save_cached_query_data, or None if missing/unreadable (a cache miss)"""
+    try:
+        data = json.loads(cache_file.read_text(encoding='utf-8'))
+        if data['format'] != _CACHE_FORMAT:
+            return None
         
+        nodes = {
+            name: QueryNode(**{**fields, 'node_type': NodeType(fields['node_type'])})
+            for name, fields in data['nodes'].items()
+        }
+        edges = {}
+        for fields in data['edges']:
+            edge = QueryEdge(**{
+                **fields,
+                'join_type': JoinType(fields['join_type']) if fields['join_type'] else None,
+                'join_keys': tuple(tuple(key) for key in fields['join_keys']),
+            })
+            edges[(edge.source, edge.target, edge.edge_type)] = edge
+        
+        return {'nodes': nodes, 'edges': edges, 'cte_hierarchy': data['cte_hierarchy']}
+    except (OSError, ValueError, KeyError, TypeError):
         return None
 
 
+def _save_cached_query_data(cache_file: Path, query_data: Dict[str, Any]):
+    """Store query data as JSON, written to a temp file and moved into place atomically"""
+    data = {
+        'format': _CACHE_FORMAT,
+        'nodes': {
+            name: {**asdict(node), 'node_type': node.node_type.value}
+            for name, node in query_data['nodes'].items()
+        },
+        'edges': [
+            {**asdict(edge), 'join_type': edge.join_type.value if edge.join_type else None}
+            for edge in query_data['edges'].values()
+        ],
+        'cte_hierarchy': query_data['cte_hierarchy'],
+    }
+    
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_file)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass  # Leave the stray temp file rather than mask the original error
+        raise
+
+
+def _dot_id(name: str) -> str:
+    """Quote a node name as a DOT identifier"""
+    return '"' + name.replace('"', '\\"') + '"'
+
+
+def _dot_attrs(**attrs: str) -> str:
+    """Format DOT attributes as key="value" pairs; label escapes such as \\n pass through unchanged"""
+    quoted = (value.replace('"', '\\"') for value in attrs.values())
+    return ' '.join(f'{key}="{value}"' for key, value in zip(attrs, quoted))
+
+
 class DiagramGenerator:
     """Generates visual diagrams from parsed query structure"""
     
@@ -379,94 +463,98 @@ class DiagramGenerator:
         edges = query_data['edges']
         cte_hierarchy = query_data.get('cte_hierarchy', {})
         
-        # Create graphviz digraph
-        dot = graphviz.Digraph(comment='SQL Query Diagram')
-        dot.attr(rankdir='LR')  # Left to right layout
-        dot.attr('node', shape='box', style='rounded,filled')
+        # DOT source is assembled as plain lines and written out in one go
+        lines = [
+            "// SQL Query Diagram",
+            "digraph {",
+            "\trankdir=LR",  # Left to right layout
+            f"\tnode [{_dot_attrs(shape='box', style='rounded,filled')}]",
+        ]
         
         # Add CTE clusters (subgraphs)
-        self._add_cte_clusters(dot, nodes, cte_hierarchy)
+        self._add_cte_clusters(lines, nodes, cte_hierarchy)
         
-        # Add nodes
+        # Add nodes; CTEs already placed inside a cluster are not emitted again
+        clustered = {name for nested_ctes in cte_hierarchy.values() for name in nested_ctes if name in nodes}
         for node_name, node in nodes.items():
-            self._add_node(dot, node_name, node)
+            if node_name not in clustered:
+                self._add_node(lines, node_name, node)
         
         # Add edges
-        for edge in edges:
-            self._add_edge(dot, edge)
+        for edge in edges.values():
+            self._add_edge(lines, edge)
+        
+        lines.append("}")
         
-        # Render diagram
+        # Render SVG and PNG from a single dot run so the layout is computed once
         try:
-            dot.render(output_path, format='svg', cleanup=True)
+            source_path = f"{output_path}.gv"
+            with open(source_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            try:
+                subprocess.run(['dot', '-Tsvg', '-o', f"{output_path}.svg",
+                                '-Tpng', '-o', f"{output_path}.png", source_path],
+                               check=True, capture_output=True)
+            finally:
+                os.remove(source_path)
             print(f"Diagram saved as {output_path}.svg")
-            
-            # Also save as PNG
-            dot.render(output_path, format='png', cleanup=True)
             print(f"Diagram saved as {output_path}.png")
             
         except Exception as e:
             print(f"Error generating diagram: {e}")
     
-    def _add_cte_clusters(self, dot, nodes: Dict[str, QueryNode], cte_hierarchy: Dict[str, List[str]]):
+    def _add_cte_clusters(self, lines: List[str], nodes: Dict[str, QueryNode], cte_hierarchy: Dict[str, List[str]]):
         """Add CTE clusters as subgraphs"""
-        cluster_id = 0
-        
-        for parent_cte, nested_ctes in cte_hierarchy.items():
-            with dot.subgraph(name=f'cluster_{cluster_id}') as cluster:
-                cluster.attr(label=f'CTE: {parent_cte}', style='dashed', color='blue')
-                cluster_id += 1
-                
-                # Add nested CTEs to cluster
-                for nested_cte in nested_ctes:
-                    if nested_cte in nodes:
-                        node = nodes[nested_cte]
-                        self._add_node_to_cluster(cluster, nested_cte, node)
-    
-    def _add_node_to_cluster(self, cluster, node_name: str, node: QueryNode):
-        """Add a node to a cluster"""
-        color = self.colors.get(node.node_type, '#FFFFFF')
-        
-        # Create label with node details
-        label = self._create_node_label(node_name, node)
-        
-        cluster.node(node_name, label=label, fillcolor=color)
+        for cluster_id, (parent_cte, nested_ctes) in enumerate(cte_hierarchy.items()):
+            lines.append(f"\tsubgraph cluster_{cluster_id} {{")
+            lines.append(f"\t\t{_dot_attrs(color='blue', label=f'CTE: {parent_cte}', style='dashed')}")
+            
+            # Add nested CTEs to cluster
+            for nested_cte in nested_ctes:
+                if nested_cte in nodes:
+                    self._add_node(lines, nested_cte, nodes[nested_cte], indent="\t\t")
+            
+            lines.append("\t}")
     
-    def _add_node(self, dot, node_name: str, node: QueryNode):
-        """Add a node to the diagram"""
+    def _add_node(self, lines: List[str], node_name: str, node: QueryNode, indent: str = "\t"):
+        """Add a node to the diagram or to one of its clusters"""
         color = self.colors.get(node.node_type, '#FFFFFF')
         
         # Create label with node details
-        label = self._create_node_label(node_name, node)
+        label = self._create_node_label(node.name, node.alias, node.schema, node.node_type, tuple(node.columns))
         
-        dot.node(node_name, label=label, fillcolor=color)
+        lines.append(f'{indent}{_dot_id(node_name)} [{_dot_attrs(label=label, fillcolor=color)}]')
     
-    def _create_node_label(self, node_name: str, node: QueryNode) -> str:
-        """Create a formatted label for a node"""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _create_node_label(name: str, alias: str, schema: str, node_type: NodeType,
+                           columns: Tuple[str, ...]) -> str:
+        """Create a formatted label for a node (memoized per node shape)"""
         label_parts = []
         
         # Node name/alias
-        if node.alias and node.alias != node.name:
-            label_parts.append(f"{node.alias}\\n({node.name})")
+        if alias and alias != name:
+            label_parts.append(f"{alias}\\n({name})")
         else:
-            label_parts.append(node.name)
+            label_parts.append(name)
         
         # Schema if present
-        if node.schema:
-            label_parts.append(f"Schema: {node.schema}")
+        if schema:
+            label_parts.append(f"Schema: {schema}")
         
         # Type
-        label_parts.append(f"Type: {node.node_type.value}")
+        label_parts.append(f"Type: {node_type.value}")
         
         # Key columns (first few)
-        if node.columns:
-            cols_display = node.columns[:3]  # Show first 3 columns
-            if len(node.columns) > 3:
-                cols_display.append(f"... (+{len(node.columns) - 3} more)")
+        if columns:
+            cols_display = list(columns[:3])  # Show first 3 columns
+            if len(columns) > 3:
+                cols_display.append(f"... (+{len(columns) - 3} more)")
             label_parts.append("Columns:\\n" + "\\n".join(cols_display))
         
         return "\\n".join(label_parts)
     
-    def _add_edge(self, dot, edge: QueryEdge):
+    def _add_edge(self, lines: List[str], edge: QueryEdge):
         """Add an edge to the diagram"""
         color = self.edge_colors.get(edge.edge_type, '#000000')
         
@@ -482,7 +570,7 @@ class DiagramGenerator:
         
         label = "\\n".join(label_parts) if label_parts else ""
         
-        dot.edge(edge.source, edge.target, label=label, color=color)
+        lines.append(f'\t{_dot_id(edge.source)} -> {_dot_id(edge.target)} [{_dot_attrs(label=label, color=color)}]')
 
 
 @click.command()
@@ -490,7 +578,8 @@ class DiagramGenerator:
 @click.option('--sql', '-s', type=str, help='SQL query string')
 @click.option('--output', '-o', default='query_diagram', help='Output file name (without extension)')
 @click.option('--dialect', '-d', default='', help='SQL dialect (postgres, mysql, bigquery, etc.)')
-def main(sql_file, sql, output, dialect):
+@click.option('--cache-dir', type=click.Path(file_okay=False), help='Directory for caching parsed queries between runs')
+def main(sql_file, sql, output, dialect, cache_dir):
     """SQL Query Visualizer - Generate diagrams from SQL queries"""
     
     if not sql_file and not sql:
@@ -500,15 +589,24 @@ def main(sql_file, sql, output, dialect):
     # Read SQL content
     sql_content = ""
     if sql_file:
-        with open(sql_file, 'r') as f:
-            sql_content = f.read()
+        sql_content = Path(sql_file).read_text(encoding='utf-8')
     else:
         sql_content = sql
     
     try:
-        # Parse SQL
-        parser = SQLQueryParser(dialect=dialect)
-        query_data = parser.parse_query(sql_content)
+        # Parse SQL, reusing a previous run's result when caching is enabled
+        cache_file = _cache_path(cache_dir, sql_content, dialect) if cache_dir else None
+        query_data = _load_cached_query_data(cache_file) if cache_file else None
+        
+        if query_data is None:
+            parser = SQLQueryParser(dialect=dialect)
+            query_data = parser.parse_query(sql_content)
+            if cache_file:
+                # The cache is optional: a failed write should not cost the diagram
+                try:
+                    _save_cached_query_data(cache_file, query_data)
+                except OSError as e:
+                    click.echo(f"⚠️  Could not write cache entry: {e}")
         
         # Generate diagram
         generator = DiagramGenerator()
@@ -522,6 +620,9 @@ def main(sql_file, sql, output, dialect):
         
     except Exception as e:
         click.echo(f"❌ Error: {e}")
+        if not getattr(sqlglot.tokens, 'SQLGLOTC_INSTALLED', True):
+            click.echo("💡 sqlglot is running its pure-Python tokenizer/parser; "
+                       "pip install 'sqlglot[c]' for the compiled (much faster) build")
 
 
 if __name__ == '__main__':